@@ -1,38 +1,59 @@
 import os
 import pandas as pd
 from glob import glob
+from package.parquetSink import ParquetSink
+from package.syncManifest import SyncManifest
 
 csv_dir = '/Users/dremind/Nutstore Files/.symlinks/坚果云/mfkQuant/历史行情数据/ETF期权历史行情'
 pkl_dir = os.path.join(csv_dir, 'pkl文件')
 os.makedirs(pkl_dir, exist_ok=True)
 
-# 获取所有sh_option_risk开头的csv文件
-csv_files = sorted(glob(os.path.join(csv_dir, 'sh_option_risk*.csv')))
+# fetch_etf_option_history.py写入的Parquet数据集及同步清单
+sink = ParquetSink(os.path.join(csv_dir, 'parquet'))
+manifest = SyncManifest(os.path.join(sink.root, 'sync_manifest.sqlite'))
 
-# 合并所有csv为一个DataFrame
-df_all = []
+# 历史上按月保存的csv（sh_option_risk_起始日_结束日.csv）按年导入：
+# 只导入清单中还没有的日期，按日期替换写入后记入清单，中断后重新运行从未完成的年份继续，不会重复导入
+csv_files = sorted(glob(os.path.join(csv_dir, 'sh_option_risk_*.csv')))
+files_by_year = {}
 for file in csv_files:
-    df = pd.read_csv(file, encoding='utf-8-sig')
-    if 'date' not in df.columns or 'ETF代码' not in df.columns or '跟踪ETF' not in df.columns:
+    files_by_year.setdefault(os.path.basename(file)[len('sh_option_risk_'):][:4], []).append(file)
+for year, files in sorted(files_by_year.items()):
+    dfs = []
+    for file in files:
+        df = pd.read_csv(file, encoding='utf-8-sig')
+        if 'date' not in df.columns or 'ETF代码' not in df.columns or '跟踪ETF' not in df.columns:
+            continue
+        dfs.append(df)
+    if not dfs:
         continue
-    df['date'] = pd.to_datetime(df['date'])
-    df_all.append(df)
-if not df_all:
+    df = pd.concat(dfs, ignore_index=True)
+    df['date'] = df['date'].astype(str).str.replace('-', '')
+    todo = manifest.missing_dates('sh_option_risk', '', sorted(df['date'].unique()))
+    if not todo:
+        continue
+    df = df[df['date'].isin(todo)]
+    n = sink.write(df, 'sh_option_risk', mode='upsert', keys=['date'])
+    manifest.mark_done('sh_option_risk', '', df['date'].value_counts().to_dict())
+    print(f"{year}年历史csv已导入{n}行")
+manifest.close()
+
+df_all = sink.read('sh_option_risk')
+if df_all.empty:
     print("无有效数据")
     exit(0)
-df_all = pd.concat(df_all, ignore_index=True)
 
 # 统计每个ETF代码对应的最常见跟踪ETF
 etf_map = (
-    df_all.groupby(['ETF代码', '跟踪ETF'])
+    df_all.groupby(['ETF代码', '跟踪ETF'], observed=True)
     .size()
     .reset_index(name='count')
     .sort_values(['ETF代码', 'count'], ascending=[True, False])
 )
-etfcode2name = etf_map.groupby('ETF代码').first()['跟踪ETF'].to_dict()
+etfcode2name = etf_map.groupby('ETF代码', observed=True).first()['跟踪ETF'].to_dict()
 
 # 按年份和ETF代码分组并保存
-for (year, etf_code), group in df_all.groupby([df_all['date'].dt.year, 'ETF代码']):
+for (year, etf_code), group in df_all.groupby([df_all['date'].dt.year, 'ETF代码'], observed=True):
     etf_name = etfcode2name.get(etf_code, 'Unknown')
     etf_safe = str(etf_name).replace('/', '_').replace('\\', '_').replace(' ', '').replace('*', '')
     code_safe = str(etf_code).replace('/', '_').replace('\\', '_').replace(' ', '').replace('*', '')
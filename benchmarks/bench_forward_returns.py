@@ -0,0 +1,109 @@
+"""
+calc_forward_returns 数组实现与calc_stock_yield原逐股票循环的耗时对比
+用法：python benchmarks/bench_forward_returns.py [股票数]
+原实现按股票分组后逐行、逐周期循环，只在前若干只股票上运行，用于校验结果并估算加速比
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from package.datacalc import forwardReturns
+from package.datacalc.forwardReturns import calc_forward_returns
+from package.datacalc.limitStatus import calc_limit_status
+from benchmarks.synthetic import make_hfq_frame
+
+PERIOD_DAYS = [1, 2, 3, 4, 5, 7, 10, 12, 15, 20, 30, 45, 60, 120, 250]
+
+
+def calc_future_returns_and_limit(sub_df, period_days):
+    """原实现"""
+    result = []
+    limit_flags = sub_df['是否涨跌停'].values
+    open_prices = sub_df['open'].values
+    close_prices = sub_df['close'].values
+    for idx in range(len(sub_df)):
+        base_idx = idx + 1
+        while base_idx < len(sub_df) and limit_flags[base_idx-1] == 1:
+            base_idx += 1
+        if base_idx >= len(sub_df):
+            result.append([np.nan]*len(period_days))
+            continue
+        base_open = open_prices[base_idx]
+        buy_cost = base_open * (1 + 0.0005)
+        rets = []
+        for offset in period_days:
+            target_idx = idx + offset
+            if target_idx < len(sub_df):
+                if limit_flags[idx] == 1:
+                    rets.append(0.0)
+                else:
+                    if buy_cost is None or buy_cost == 0 or np.isnan(buy_cost):
+                        ret = np.nan
+                    else:
+                        ret = round(close_prices[target_idx] / buy_cost - 1, 4)
+                    rets.append(ret)
+            else:
+                rets.append(np.nan)
+        result.append(rets)
+    rets_df = pd.DataFrame(result, columns=[str(x) for x in period_days])
+    return rets_df
+
+
+def legacy(df, period_days):
+    future_rets = []
+    for code, sub_df in df.groupby('code'):
+        sub_df = sub_df.reset_index(drop=True)
+        future_rets.append(calc_future_returns_and_limit(sub_df, period_days))
+    return pd.concat(future_rets, ignore_index=True).values
+
+
+def prepare(n_codes, seed=0):
+    """两年窗口的行情，与calc_stock_yield每个年份窗口的数据量相当"""
+    df = make_hfq_frame(n_codes, '20230101', '20241231', seed=seed)
+    df = df.sort_values(['code', 'date']).reset_index(drop=True)
+    df['pre_close'] = df.groupby('code')['close'].shift(1)
+    df['是否涨跌停'] = calc_limit_status(df['high'], df['low'], df['pre_close'])
+    # 合成数据的一字板很少连续出现，另外加入连续涨停，覆盖跳过涨停日寻找买入日的逻辑
+    rng = np.random.default_rng(seed)
+    streak = rng.random(len(df)) < 0.01
+    for k in range(1, 4):
+        streak[k:] |= streak[:-k] & (rng.random(len(df) - k) < 0.6)
+    df.loc[streak, '是否涨跌停'] = 1
+    # 开盘价为0时原实现返回NaN
+    df.loc[rng.random(len(df)) < 0.001, 'open'] = 0.0
+    return df
+
+
+def timed(func, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def run(df, engine):
+    return calc_forward_returns(df['code'], df['是否涨跌停'], df['open'], df['close'], PERIOD_DAYS, engine=engine)
+
+
+def main(n_codes=1000, legacy_codes=100):
+    df = prepare(n_codes)
+    small = df[df['code'].isin(df['code'].unique()[:legacy_codes])].reset_index(drop=True)
+    engines = ['numpy'] + (['numba'] if forwardReturns.numba is not None else [])
+    if 'numba' in engines:
+        run(small.head(10), 'numba')  # 编译不计入耗时
+
+    old_small, t_old = timed(legacy, small, PERIOD_DAYS)
+    for engine in engines:
+        new_small, t_new_small = timed(run, small, engine)
+        np.testing.assert_array_equal(new_small, old_small)
+        _, t_new = timed(run, df, engine)
+        print(f"[{engine}] {legacy_codes}只股票（{len(small)}行，{len(PERIOD_DAYS)}个周期）："
+              f"原实现 {t_old:.2f}s，数组实现 {t_new_small:.4f}s，加速 {t_old / t_new_small:.0f}倍，结果一致")
+        print(f"[{engine}] {n_codes}只股票（{len(df)}行）：数组实现 {t_new:.3f}s；"
+              f"原实现按股票数线性外推约 {t_old * n_codes / legacy_codes:.0f}s")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
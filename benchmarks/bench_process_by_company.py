@@ -0,0 +1,128 @@
+"""
+FoDataProcessor.process_by_company 向量化实现与原逐行实现的耗时对比
+用法：python benchmarks/bench_process_by_company.py [年数]
+原实现为O(会员数 × 行数)的逐行循环，只在前几个交易日的数据上运行，用于校验结果并估算加速比
+"""
+import os
+import sys
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from package.foDataProcessor import FoDataProcessor
+from package.tradeCalendar import TradeCalendar
+from benchmarks.synthetic import make_rank_data
+
+
+class LegacyProcessor(FoDataProcessor):
+    """原逐行实现"""
+    def process_by_company(self, df):
+        """Process data by company and return structured DataFrame"""
+        df = self._clean_data(df)  # 清理数据
+        
+        company_set = set(
+            self._clean_company_name(x) for x in 
+            df['成交量-会员简称'].tolist() +
+            df['买单-会员简称'].tolist() +
+            df['卖单-会员简称'].tolist()
+            if pd.notna(x)
+        )
+
+        result_dfs = []
+        for company in company_set:
+            company_data = []
+            for _, row in df.iterrows():
+                c1 = self._clean_company_name(row['成交量-会员简称'])
+                c2 = self._clean_company_name(row['买单-会员简称'])
+                c3 = self._clean_company_name(row['卖单-会员简称'])
+                
+                if company in (c1, c2, c3):
+                    base_data = {
+                        'date': row['date'],
+                        '合约代码': row['合约代码'],
+                        '公司简称': company,
+                        '合约类型': row['合约类型'],
+                        '是否主连合约': self.is_main_contract(row['date'], row['合约代码'])
+                    }
+                    
+                    # Process each dimension separately
+                    if c1 == company:
+                        vol_data = base_data.copy()
+                        vol_data.update({
+                            '统计维度': '成交量',
+                            '排名': row['排名'],
+                            '数值': row['成交量-成交量'],
+                            '比上一交易日增减': row['成交量-比上一交易日增减'],
+                            '比上一交易日增减比例': self._calc_change_rate(
+                                row['成交量-成交量'], 
+                                row['成交量-比上一交易日增减']
+                            )
+                        })
+                        company_data.append(vol_data)
+                        
+                    if c2 == company:
+                        buy_data = base_data.copy()
+                        buy_data.update({
+                            '统计维度': '持买单量',
+                            '排名': row['排名'],
+                            '数值': row['买单-持买单量'],
+                            '比上一交易日增减': row['买单-比上一交易日增减'],
+                            '比上一交易日增减比例': self._calc_change_rate(
+                                row['买单-持买单量'], 
+                                row['买单-比上一交易日增减']
+                            )
+                        })
+                        company_data.append(buy_data)
+                        
+                    if c3 == company:
+                        sell_data = base_data.copy()
+                        sell_data.update({
+                            '统计维度': '持卖单量',
+                            '排名': row['排名'],
+                            '数值': row['卖单-持卖单量'],
+                            '比上一交易日增减': row['卖单-比上一交易日增减'],
+                            '比上一交易日增减比例': self._calc_change_rate(
+                                row['卖单-持卖单量'], 
+                                row['卖单-比上一交易日增减']
+                            )
+                        })
+                        company_data.append(sell_data)
+            
+            if company_data:
+                result_dfs.append(pd.DataFrame(company_data))
+        
+        return pd.concat(result_dfs, ignore_index=True) if result_dfs else pd.DataFrame()
+
+
+def timed(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t0
+
+
+def main(years=3, legacy_days=10):
+    df = make_rank_data(years=years)
+    dates = df['date'].unique()
+    small = df[df['date'].isin(dates[:legacy_days])].reset_index(drop=True)
+    # 交易日历只加载一次，不计入耗时
+    calendar = TradeCalendar.from_local_data()
+    new, legacy = FoDataProcessor(calendar), LegacyProcessor(calendar)
+
+    new_small, t_new_small = timed(new.process_by_company, small)
+    old_small, t_old_small = timed(legacy.process_by_company, small)
+    # 原实现按集合遍历公司，顺序不固定；按公司稳定排序后与新实现的顺序一致
+    old_small = old_small.sort_values('公司简称', kind='stable').reset_index(drop=True)
+    pd.testing.assert_frame_equal(new_small, old_small, check_dtype=False)
+
+    _, t_new = timed(new.process_by_company, df)
+    print(f"{legacy_days}个交易日（{len(small)}行）：原实现 {t_old_small:.2f}s，向量化 {t_new_small:.3f}s，"
+          f"加速 {t_old_small / t_new_small:.0f}倍，结果一致")
+    # 原实现耗时与 行数 × 会员数 成正比
+    n_companies = new_small['公司简称'].nunique()
+    scale = len(df) / len(small)
+    print(f"{years}年（{len(df)}行）：向量化 {t_new:.2f}s；原实现按行数线性外推至少 {t_old_small * scale / 60:.0f}分钟"
+          f"（未计入会员数增长，{legacy_days}个交易日内已有{n_companies}家会员）")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
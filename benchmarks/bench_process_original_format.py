@@ -0,0 +1,125 @@
+"""
+FoDataProcessor.process_original_format 向量化实现与原逐行实现的耗时对比
+用法：python benchmarks/bench_process_original_format.py [年数]
+原实现在每个(日期, 合约)分组内对每家公司重复遍历整组，只在前几个交易日的数据上运行，用于校验结果并估算加速比
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from package.foDataProcessor import FoDataProcessor
+from package.tradeCalendar import TradeCalendar
+from benchmarks.synthetic import make_rank_data
+
+
+class LegacyProcessor(FoDataProcessor):
+    """原逐行实现"""
+    def process_original_format(self, df):
+        """Process data in original format with all dimensions combined"""
+        df = self._clean_data(df)  # 清理数据
+        result_rows = []
+        grouped = df.groupby(['date', '合约代码', '合约类型'])
+        
+        for (date, contract, contract_type), group in grouped:
+            # Get all unique companies in this group
+            companies = set(
+                self._clean_company_name(x) for x in 
+                group['成交量-会员简称'].tolist() +
+                group['买单-会员简称'].tolist() +
+                group['卖单-会员简称'].tolist()
+                if pd.notna(x)
+            )
+            
+            for company in companies:
+                row_data = {
+                    'date': date,
+                    '合约代码': contract,
+                    '公司简称': company,
+                    '合约类型': contract_type,
+                    '是否主连合约': self.is_main_contract(date, contract),
+                    '成交量排名': '',
+                    '买单排名': '',
+                    '卖单排名': '',
+                    '成交量': '',
+                    '成交量-比上一交易日增减': '',
+                    '成交量-比上一交易日增减比例': '',
+                    '买单-持买单量': '',
+                    '买单-比上一交易日增减': '',
+                    '买单-比上一交易日增减比例': '',
+                    '卖单-持卖单量': '',
+                    '卖单-比上一交易日增减': '',
+                    '卖单-比上一交易日增减比例': ''
+                }
+                
+                # Fill data for each dimension
+                for _, record in group.iterrows():
+                    if self._clean_company_name(record['成交量-会员简称']) == company:
+                        row_data.update({
+                            '成交量排名': record['排名'],
+                            '成交量': record['成交量-成交量'],
+                            '成交量-比上一交易日增减': record['成交量-比上一交易日增减'],
+                            '成交量-比上一交易日增减比例': self._calc_change_rate(
+                                record['成交量-成交量'],
+                                record['成交量-比上一交易日增减']
+                            )
+                        })
+                        
+                    if self._clean_company_name(record['买单-会员简称']) == company:
+                        row_data.update({
+                            '买单排名': record['排名'],
+                            '买单-持买单量': record['买单-持买单量'],
+                            '买单-比上一交易日增减': record['买单-比上一交易日增减'],
+                            '买单-比上一交易日增减比例': self._calc_change_rate(
+                                record['买单-持买单量'],
+                                record['买单-比上一交易日增减']
+                            )
+                        })
+                        
+                    if self._clean_company_name(record['卖单-会员简称']) == company:
+                        row_data.update({
+                            '卖单排名': record['排名'],
+                            '卖单-持卖单量': record['卖单-持卖单量'],
+                            '卖单-比上一交易日增减': record['卖单-比上一交易日增减'],
+                            '卖单-比上一交易日增减比例': self._calc_change_rate(
+                                record['卖单-持卖单量'],
+                                record['卖单-比上一交易日增减']
+                            )
+                        })
+                
+                result_rows.append(row_data)
+        
+        return pd.DataFrame(result_rows)
+
+
+def timed(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t0
+
+
+def main(years=10, legacy_days=3):
+    df = make_rank_data(years=years, symbols=('IF', 'IC', 'IM', 'IH', 'TS', 'TF', 'T', 'TL', 'IO', 'MO', 'HO'))
+    dates = df['date'].unique()
+    small = df[df['date'].isin(dates[:legacy_days])].reset_index(drop=True)
+    # 交易日历只加载一次，不计入耗时
+    calendar = TradeCalendar.from_local_data()
+    new, legacy = FoDataProcessor(calendar), LegacyProcessor(calendar)
+
+    new_small, t_new_small = timed(new.process_original_format, small)
+    old_small, t_old_small = timed(legacy.process_original_format, small)
+    # 原实现组内公司顺序不固定，缺失值为''或None；排序并替换为NaN后与新实现比较
+    old_small = old_small.sort_values(['date', '合约代码', '合约类型', '公司简称'], kind='stable')
+    old_small = old_small.mask(old_small.eq('') | old_small.isna(), np.nan).reset_index(drop=True)
+    pd.testing.assert_frame_equal(new_small, old_small, check_dtype=False)
+
+    _, t_new = timed(new.process_original_format, df)
+    print(f"{legacy_days}个交易日（{len(small)}行）：原实现 {t_old_small:.2f}s，向量化 {t_new_small:.3f}s，"
+          f"加速 {t_old_small / t_new_small:.0f}倍，结果一致")
+    print(f"{years}年全部品种（{len(df)}行）：向量化 {t_new:.2f}s")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
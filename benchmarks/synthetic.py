@@ -0,0 +1,99 @@
+"""
+基准测试用的合成数据
+"""
+import numpy as np
+import pandas as pd
+
+RANK_COLUMNS = [
+    'date', '合约代码', '排名',
+    '成交量-会员简称', '成交量-成交量', '成交量-比上一交易日增减',
+    '买单-会员简称', '买单-持买单量', '买单-比上一交易日增减',
+    '卖单-会员简称', '卖单-持卖单量', '卖单-比上一交易日增减',
+    '合约类型'
+]
+
+
+def make_rank_data(start='20220101', years=3, symbols=('IF', 'IC', 'IM', 'IH'), n_members=150, top=20, seed=0):
+    """
+    生成与get_cffex_position_rank_batch输出格式一致的持仓排名数据
+    每个交易日、每个品种有当月、次月两个合约，每个合约top名会员
+    :return: DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    # 会员简称中夹杂空白，覆盖_clean_company_name的清理逻辑
+    members = np.array([f"会员 {i:03d}" if i % 7 == 0 else f"会员{i:03d}" for i in range(n_members)], dtype=object)
+    days = pd.bdate_range(pd.Timestamp(start), periods=int(years * 244))
+    # 每个(交易日, 品种, 当月/次月)为一组，每组top行
+    day_idx, sym_idx, month_idx = [a.ravel() for a in np.meshgrid(
+        np.arange(len(days)), np.arange(len(symbols)), np.arange(2), indexing='ij')]
+    months = np.where(month_idx == 0, days[day_idx].strftime('%y%m'),
+                      (days[day_idx] + pd.offsets.MonthBegin(1)).strftime('%y%m'))
+    codes = np.char.add(np.array(symbols)[sym_idx].astype(str), months.astype(str))
+    n_groups = len(codes)
+    n = n_groups * top
+    df = pd.DataFrame({
+        'date': np.repeat(days[day_idx].strftime('%Y%m%d'), top),
+        '合约代码': np.repeat(codes, top),
+        '排名': np.tile(np.arange(1, top + 1), n_groups),
+    })
+    volume = -np.sort(-rng.integers(1000, 100000, (n_groups, top)), axis=1).ravel()
+    for prefix, value_col in [('成交量', '成交量-成交量'), ('买单', '买单-持买单量'), ('卖单', '卖单-持卖单量')]:
+        # 组内会员不重复
+        picks = np.argsort(rng.random((n_groups, n_members)), axis=1)[:, :top].ravel()
+        df[f'{prefix}-会员简称'] = members[picks]
+        df[value_col] = volume
+        df[f'{prefix}-比上一交易日增减'] = rng.integers(-2000, 2000, n)
+    df['合约类型'] = np.repeat(np.array(symbols)[sym_idx], top)
+    df = df[RANK_COLUMNS]
+    # 部分缺失的会员简称和增减为0的行
+    df.loc[df.sample(frac=0.01, random_state=seed).index, '卖单-会员简称'] = np.nan
+    df.loc[df.sample(frac=0.01, random_state=seed + 1).index, '成交量-比上一交易日增减'] = df['成交量-成交量']
+    return df
+
+
+def make_hfq_frame(n_codes=500, start='20170101', end='20251231', seed=0):
+    """
+    生成后复权日线行情，字段与本地Astock_hfq_parquet_by_year数据一致
+    价格为随机游走，约1%的交易日为一字板（high == low），用于覆盖涨跌停逻辑
+    :return: DataFrame，按code、date排序
+    """
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(start, end)
+    codes = np.array([f"{i:06d}" for i in range(1, n_codes + 1)])
+    n_days = len(days)
+    rets = rng.normal(0, 0.02, (n_codes, n_days))
+    close = np.round(10 * np.exp(np.cumsum(rets, axis=1)) * rng.uniform(1, 50, (n_codes, 1)), 2)
+    pre_close = np.concatenate([close[:, :1], close[:, :-1]], axis=1)
+    open_ = np.round(pre_close * (1 + rng.normal(0, 0.01, close.shape)), 2)
+    high = np.round(np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, close.shape))), 2)
+    low = np.round(np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, close.shape))), 2)
+    # 一字板：开高低收相同，涨停或跌停
+    board = rng.random(close.shape) < 0.01
+    limit_price = np.round(pre_close * np.where(rng.random(close.shape) < 0.7, 1.1, 0.9), 2)
+    for arr in (open_, high, low, close):
+        arr[board] = limit_price[board]
+    volume = rng.integers(1000, 10_000_000, close.shape).astype(float)
+    df = pd.DataFrame({
+        'date': np.tile(days.values, n_codes),
+        'code': np.repeat(codes, n_days),
+        'open': open_.ravel(),
+        'high': high.ravel(),
+        'low': low.ravel(),
+        'close': close.ravel(),
+        'volume': volume.ravel(),
+        'amount': (volume * close).ravel(),
+        'turnover': rng.uniform(0, 0.2, close.shape).ravel(),
+    })
+    # 上市前、停牌的交易日没有数据
+    listed = np.repeat(rng.integers(0, n_days // 3, n_codes), n_days) <= np.tile(np.arange(n_days), n_codes)
+    suspended = rng.random(len(df)) < 0.02
+    return df[listed & ~suspended].reset_index(drop=True)
+
+
+def write_hfq_dataset(base_dir, df, batch_size=100):
+    """按oldData2Parquet.py的方式，每批batch_size只股票写入一次，按year分区"""
+    codes = df['code'].unique()
+    for i in range(0, len(codes), batch_size):
+        batch = df[df['code'].isin(codes[i:i + batch_size])].copy()
+        batch['year'] = pd.to_datetime(batch['date']).dt.year.astype(str)
+        batch.to_parquet(base_dir, partition_cols=['year'], index=False, engine='pyarrow')
@@ -1,16 +1,16 @@
 import pandas as pd
-import numpy as np
 from datetime import datetime
 from package.readLocalData import LocalMarketData
-import hashlib
-from tqdm import tqdm
+from package.datacalc.limitStatus import calc_limit_status
+from package.datacalc.forwardReturns import calc_forward_returns
+from package.datacalc.resultStore import ResultStore, hash_rows, array_column_names
 import os
-
-print("开始运行，当前系统时间:", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import pyarrow as pa
 
 base_dir = '/Users/dremind/Nutstore Files/.symlinks/坚果云/mfkQuant/Parquet数据/Astock_hfq_parquet_by_year'
+output_root = '/Users/dremind/Nutstore Files/.symlinks/坚果云/mfkQuant/Parquet数据'
 cols = ['date', 'code', 'open', 'close', 'high', 'low']
-market_data = LocalMarketData(base_dir)
 
 period_days_short = [1,2,3,4,5]
 period_days_middle = [7,10,12,15,20]
@@ -20,108 +20,147 @@ periods_dict = {
     'middle': period_days_middle,
     'long': period_days_long
 }
+# 全部周期段的周期合并后一次计算
+all_period_days = sorted(set(d for days in periods_dict.values() for d in days))
 
 years = list(range(2017, 2025))  # 只到2024，最后一年单独处理
-for period_tag, period_days in periods_dict.items():
+
+# --------- 并行配置 ---------
+# 并行进程数，1为在当前进程中顺序计算
+workers = max(1, (os.cpu_count() or 2) // 2)
+# 同时计算的年份窗口的估算内存合计上限（字节），超出时后面的年份等待前面的完成
+memory_limit = 32 * 1024 ** 3
+# 每行行情在计算过程中的估算内存峰值（字节），含15个周期的收益率及中间数组；实测约500字节，留有余量
+bytes_per_row = 1024
+# 行情的Arrow IPC缓存目录，各进程以内存映射方式读取同一份缓存；应放在本地磁盘，不要放在同步盘中
+ipc_cache_dir = os.path.expanduser('~/.cache/mfkQuant/hfq_ipc')
+
+# 工作进程中的行情读取对象，由_init_worker创建
+_market_data = None
+
+
+def calc_year_window(market_data, year):
+    """
+    读取当前年和下一年数据，计算是否涨跌停和全部周期的未来收益率
+    :return: 当前年份的DataFrame，各周期收益率列名为周期字符串，无数据时为空DataFrame
+    """
+    next_year = year + 1
+    df = market_data.read_hfq_data(year, next_year, columns=cols)
+    if df.empty:
+        return df
+    df = df.sort_values(['code', 'date']).reset_index(drop=True)
+
+    # 计算是否涨跌停
+    df['pre_close'] = df.groupby('code')['close'].shift(1)
+    df['是否涨跌停'] = calc_limit_status(df['high'], df['low'], df['pre_close'])
+
+    # 计算未来收益率：所有股票、所有周期段的全部周期一次计算
+    period_names = [str(x) for x in all_period_days]
+    df[period_names] = calc_forward_returns(df['code'], df['是否涨跌停'], df['open'], df['close'], all_period_days)
+
+    # 只保留当前年份的数据
+    df['年份'] = pd.to_datetime(df['date']).dt.year.astype(str)
+    return df[df['年份'] == str(year)].copy()
+
+
+def build_result(df_this_year, period_days):
+    """组装某个周期段的结果表"""
     period_names = [str(x) for x in period_days]
-    print(f"开始计算周期段: {period_tag}, 周期: {period_names}")
-    output_dir = f'/Users/dremind/Nutstore Files/.symlinks/坚果云/mfkQuant/Parquet数据/stock_yield_results_{period_tag}'
-    os.makedirs(output_dir, exist_ok=True)
-
-    for i, year in enumerate(years):
-        # 读取当前年和下一年数据
-        next_year = year + 1
-        print(f"处理年份窗口: {year}-{next_year}")
-        df = market_data.read_hfq_data(year, next_year, columns=cols)
-        df = df.sort_values(['code', 'date']).reset_index(drop=True)
-
-        # 计算是否涨跌停
-        df['pre_close'] = df.groupby('code')['close'].shift(1)
-        def limit_status(row):
-            if row['high'] == row['low']:
-                if row['pre_close'] is not None and not np.isnan(row['pre_close']):
-                    if row['high'] >= round(row['pre_close'] * 1.044, 2):
-                        return 1
-                    elif row['low'] <= round(row['pre_close'] * 0.956, 2):
-                        return -1
-            return 0
-        df['是否涨跌停'] = df.apply(limit_status, axis=1)
-
-        # 计算未来收益率
-        def calc_future_returns_and_limit(sub_df, period_days):
-            result = []
-            limit_flags = sub_df['是否涨跌停'].values
-            open_prices = sub_df['open'].values
-            close_prices = sub_df['close'].values
-            for idx in range(len(sub_df)):
-                base_idx = idx + 1
-                while base_idx < len(sub_df) and limit_flags[base_idx-1] == 1:
-                    base_idx += 1
-                if base_idx >= len(sub_df):
-                    result.append([np.nan]*len(period_days))
-                    continue
-                base_open = open_prices[base_idx]
-                buy_cost = base_open * (1 + 0.0005)
-                rets = []
-                for offset in period_days:
-                    target_idx = idx + offset
-                    if target_idx < len(sub_df):
-                        if limit_flags[idx] == 1:
-                            rets.append(0.0)
-                        else:
-                            if buy_cost is None or buy_cost == 0 or np.isnan(buy_cost):
-                                ret = np.nan
-                            else:
-                                ret = round(close_prices[target_idx] / buy_cost - 1, 4)
-                            rets.append(ret)
-                    else:
-                        rets.append(np.nan)
-                result.append(rets)
-            rets_df = pd.DataFrame(result, columns=[str(x) for x in period_days])
-            return rets_df
-
-        future_rets = []
-        for code, sub_df in tqdm(df.groupby('code'), desc=f'计算未来收益率-{period_tag}-{year}'):
-            sub_df = sub_df.reset_index(drop=True)
-            rets = calc_future_returns_and_limit(sub_df, period_days)
-            future_rets.append(rets)
-        future_rets_df = pd.concat(future_rets, ignore_index=True)
-        df[period_names] = future_rets_df
-
-        # 只保留当前年份的数据
-        df['年份'] = pd.to_datetime(df['date']).dt.year.astype(str)
-        df_this_year = df[df['年份'] == str(year)].copy()
-        if df_this_year.empty:
-            continue
-
-        # 组装结果表
-        result = pd.DataFrame()
-        result['股票代码'] = df_this_year['code']
-        result['日期'] = df_this_year['date']
-        result['股价后复权'] = df_this_year['close']
-        result['是否涨跌停'] = df_this_year['是否涨跌停']
-        result['未来收益周期'] = [period_names] * len(df_this_year)
-        result['未来收益率'] = df_this_year[period_names].values.tolist()
-
-        # 版本哈希与入库时间
-        def get_hash(row):
-            s = f"{row['股票代码']}_{row['日期']}_{row['股价后复权']}_{row['未来收益率']}"
-            return hashlib.md5(s.encode('utf-8')).hexdigest()
-        result['版本哈希'] = result.apply(get_hash, axis=1)
-        result['入库时间'] = datetime.now().strftime('%Y-%m-%d %H%M%S')
-        result['年份'] = pd.to_datetime(result['日期']).dt.year.astype(str)
-
-        # 设置索引
-        result = result.set_index(['日期', '股票代码'])
-
-        # 按年份分区追加保存
-        print(f"即将写入{period_tag} {year}，数据量：", result.shape)
-        result.to_parquet(
-            output_dir,
-            partition_cols=['年份'],
-            index=True,
-            engine='pyarrow'
+    result = pd.DataFrame()
+    result['股票代码'] = df_this_year['code']
+    result['日期'] = df_this_year['date']
+    result['股价后复权'] = df_this_year['close']
+    result['是否涨跌停'] = df_this_year['是否涨跌停']
+    # 未来收益率按周期展开为多列，写入时合并为定长数组列，周期标签保存在schema元数据中
+    result[array_column_names('未来收益率', period_names)] = df_this_year[period_names].to_numpy()
+
+    # 版本哈希与入库时间：哈希按列向量化计算，重复运行时哈希不变的行不会重写
+    result['版本哈希'] = hash_rows(df_this_year[['code', 'date', 'close', '是否涨跌停'] + period_names])
+    result['入库时间'] = datetime.now().strftime('%Y-%m-%d %H%M%S')
+    result['年份'] = pd.to_datetime(result['日期']).dt.year.astype(str)
+
+    # 设置索引
+    return result.set_index(['日期', '股票代码'])
+
+
+def make_stores():
+    """各周期段的结果数据集"""
+    return {
+        period_tag: ResultStore(
+            os.path.join(output_root, f'stock_yield_results_{period_tag}'),
+            array_columns={'未来收益率': [str(x) for x in period_days]}
         )
-        print(f"{period_tag} {year}段写入完成，当前系统时间:", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        for period_tag, period_days in periods_dict.items()
+    }
+
+
+def _init_worker(data_dir, cache_dir, cache_bytes=0, cpu_count=None):
+    """工作进程初始化：创建读取IPC缓存的行情对象，限制pyarrow线程数避免多进程争抢CPU"""
+    global _market_data
+    if cpu_count is not None:
+        pa.set_cpu_count(cpu_count)
+    _market_data = LocalMarketData(data_dir, ipc_cache_dir=cache_dir, cache_bytes=cache_bytes)
+
+
+def run_year(year):
+    """
+    计算一个年份窗口并写入各周期段数据集的 年份=year 分区，各年份写入不同的分区，互不影响
+    :return: (year, {周期段: 写入统计})
+    """
+    df_this_year = calc_year_window(_market_data, year)
+    stats = {}
+    if df_this_year.empty:
+        return year, stats
+    # 同一份计算结果按周期段分别写入各自的数据集，分区整体替换
+    for period_tag, store in make_stores().items():
+        stats[period_tag] = store.upsert(build_result(df_this_year, periods_dict[period_tag]))
+    return year, stats
+
+
+def report(year, stats):
+    for period_tag, s in stats.items():
+        print(f"{period_tag} {year}：新增{s['inserted']}行，更新{s['updated']}行，未变化{s['unchanged']}行")
+    print(f"{year}年写入完成，当前系统时间:", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def main(workers=workers, memory_limit=memory_limit):
+    print("开始运行，当前系统时间:", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    print(f"周期: {all_period_days}，年份: {years}，进程数: {workers}")
+    # 预先转换IPC缓存，工作进程只读缓存，不会并发转换同一年份
+    market_data = LocalMarketData(base_dir, ipc_cache_dir=ipc_cache_dir)
+    window_years = sorted(set(y for year in years for y in (year, year + 1)) & set(market_data.years()))
+    market_data.build_ipc_cache(window_years)
+    rows = market_data.count_rows(window_years)
+    estimate = {year: (rows.get(year, 0) + rows.get(year + 1, 0)) * bytes_per_row for year in years}
+    # 在主进程中创建数据集目录
+    make_stores()
+
+    if workers <= 1:
+        # 相邻年份窗口重叠一年，缓存已解码的年份分区
+        _init_worker(base_dir, ipc_cache_dir, cache_bytes=2 * 1024 ** 3)
+        for year in years:
+            report(*run_year(year))
+        print("年份分区缓存:", _market_data.partition_cache.stats)
+    else:
+        # 数据量大的年份先算；估算内存合计不超过memory_limit，至少有一个年份在计算
+        pending = sorted(years, key=lambda y: -estimate[y])
+        running = {}
+        in_use = 0
+        cpu_count = max(1, (os.cpu_count() or workers) // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(base_dir, ipc_cache_dir, 0, cpu_count)) as executor:
+            while pending or running:
+                while pending and len(running) < workers and (not running or in_use + estimate[pending[0]] <= memory_limit):
+                    year = pending.pop(0)
+                    running[executor.submit(run_year, year)] = year
+                    in_use += estimate[year]
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_use -= estimate[running.pop(future)]
+                    report(*future.result())
+
+    print("全部运行结束，当前系统时间:", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
 
-print("全部运行结束，当前系统时间:", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+if __name__ == '__main__':
+    main()
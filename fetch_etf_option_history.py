@@ -1,15 +1,23 @@
 import os
-import time
-from datetime import datetime, timedelta
+from datetime import datetime
 import pandas as pd
 from tqdm import tqdm
 from package.getOptionData import foDataFetcher
+from package.syncManifest import SyncManifest
+from package.parquetSink import ParquetSink
+from package.memberDict import MemberDictionary
 
 
 save_dir = '/Users/dremind/Nutstore Files/.symlinks/坚果云/mfkQuant/历史行情数据/ETF期权历史行情'
 os.makedirs(save_dir, exist_ok=True)
 
 fetcher = foDataFetcher()
+# 抓取结果直接写入按 接口/年份 分区的Parquet数据集
+sink = ParquetSink(os.path.join(save_dir, 'parquet'))
+# 已入库的(接口, 品种, 日期)清单，每次运行只抓取缺失或过时的交易日，中断后重新运行即可续传
+manifest = SyncManifest(os.path.join(sink.root, 'sync_manifest.sqlite'))
+# 持仓排名中的会员简称以int16会员ID入库，名称与ID的对应关系保存在会员字典中
+members = MemberDictionary(os.path.join(sink.root, 'member_dict.csv'))
 
 # --------- 配置区 ---------
 # ETF期权相关数据
@@ -28,6 +36,9 @@ data_end_date = datetime.today()
 # options: 'sh_option_risk', 'sz_option_risk', 'sz_etf_op_market', 'cffex_position_rank'
 fetch_func = 'cffex_position_rank'  # 修改此处即可切换接口
 
+# 持仓排名要抓取的品种，全部品种为 foDataFetcher.FUTURE_SYMBOLS + foDataFetcher.OPTION_SYMBOLS
+rank_symbols = ['IF', 'IH']
+
 if fetch_func == 'sh_option_risk':
     func = fetcher.get_sh_option_risk
     file_prefix = 'sh_option_risk'
@@ -44,54 +55,76 @@ elif fetch_func == 'sz_etf_op_market':
     s_date = data_start_date
     e_date = data_end_date
 elif fetch_func == 'cffex_position_rank':
-    func = fetcher.get_cffex_position_rank
+    func = fetcher.get_cffex_position_rank_batch
     file_prefix = 'cffex_position_rank'
     s_date = rank_start_date
     e_date = rank_end_date
 else:
     raise ValueError("fetch_func 仅支持 'sh_option_risk', 'sz_option_risk', 'sz_etf_op_market', 'cffex_position_rank'")
 
-# 计算需要抓取的月份数
-month_list = []
-cur = s_date
-while cur < e_date:
-    month_start = cur.replace(day=1)
-    next_month = (month_start + timedelta(days=32)).replace(day=1)
-    month_end = min(next_month - timedelta(days=1), e_date)
-    month_list.append((month_start, month_end))
-    cur = next_month
-
-for month_start, month_end in tqdm(month_list, desc="抓取进度"):
-    s_str = month_start.strftime('%Y%m%d')
-    e_str = month_end.strftime('%Y%m%d')
-    print(f"正在获取 {s_str} 至 {e_str} 的数据...")
+# 清单中的品种，除持仓排名外的接口只有一份数据
+symbols = rank_symbols if fetch_func == 'cffex_position_rank' else ['']
+# 写入时按(日期, 品种)替换已有数据，重复抓取同一天（如写入后、记入清单前中断）不会产生重复行
+upsert_keys = ['date', '合约类型'] if fetch_func == 'cffex_position_rank' else ['date']
+
+
+def rows_per_day(df, dates, symbol=''):
+    """统计每个交易日的行数，无数据的交易日为0"""
+    if df.empty:
+        return {d: 0 for d in dates}
+    if symbol:
+        df = df[df['合约类型'] == symbol]
+    counts = df['date'].astype(str).str.replace('-', '').value_counts()
+    return {d: int(counts.get(d, 0)) for d in dates}
+
+
+def split_runs(dates, todo):
+    """把待抓取日期切分为连续交易日区间，且每个区间不跨月"""
+    runs = []
+    for i, d in enumerate(dates):
+        if d not in todo:
+            continue
+        if runs and runs[-1][-1] == dates[i - 1] and runs[-1][-1][:6] == d[:6]:
+            runs[-1].append(d)
+        else:
+            runs.append([d])
+    return runs
+
+
+# 每个品种只抓取自己缺失或过时的交易日；区间相同的品种合并为一批下载，每批完成后立即入库
+all_dates = fetcher.calendar.trading_days(s_date, e_date, fmt='%Y%m%d')
+batches = {}
+for symbol in symbols:
+    for run in split_runs(all_dates, set(manifest.missing_dates(file_prefix, symbol, all_dates))):
+        batches.setdefault(tuple(run), []).append(symbol)
+batches = sorted(batches.items())
+
+n_units = sum(len(run) * len(batch_symbols) for run, batch_symbols in batches)
+print(f"{file_prefix}: 共{len(all_dates)}个交易日、{len(symbols)}个品种，需抓取{n_units}个(日期, 品种)，分为{len(batches)}批")
+for run, batch_symbols in tqdm(batches, desc="抓取进度"):
+    s_str, e_str = run[0], run[-1]
+    label = f"{s_str}-{e_str}" + (f" {','.join(batch_symbols)}" if batch_symbols != [''] else '')
+    print(f"正在获取 {label} 的数据...")
     try:
         if fetch_func == 'cffex_position_rank':
-            # 可根据需要循环symbol，这里以'IF'为例，如需全部symbol可自行扩展
-            for symbol in ['IF', 'IH'] #, 'IC', 'IM', 'TS', 'TF', 'T', 'TL', 'IO', 'MO', 'HO']:
-                df = func(symbol=symbol, start_date=s_str, end_date=e_str)
-                if not df.empty:
-                    csv_path = os.path.join(save_dir, f"{file_prefix}_{symbol}_{s_str}_{e_str}.csv")
-                    df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-                    print(f"已保存：{csv_path}")
-                else:
-                    print(f"{symbol} {s_str}-{e_str} 无数据")
-        elif fetch_func == 'sh_option_risk':
-            df = func(start_date=s_str, end_date=e_str)
-            if not df.empty:
-                csv_path = os.path.join(save_dir, f"{file_prefix}_{s_str}_{e_str}.csv")
-                df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-                print(f"已保存：{csv_path}")
-            else:
-                print(f"{s_str}-{e_str} 无数据")
+            # 同一批的品种一次批量下载，品种保存在'合约类型'列
+            df = func(symbols=batch_symbols, start_date=s_str, end_date=e_str, members=members)
+            failed = set(fetcher.failed_dates)
         else:
             df = func(start_date=s_str, end_date=e_str)
-            if not df.empty:
-                csv_path = os.path.join(save_dir, f"{file_prefix}_{s_str}_{e_str}.csv")
-                df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-                print(f"已保存：{csv_path}")
-            else:
-                print(f"{s_str}-{e_str} 无数据")
+            failed = {(str(d).replace('-', ''), '') for d in fetcher.failed_dates}
+        if not df.empty:
+            n = sink.write(df, file_prefix, mode='upsert', keys=upsert_keys)
+            print(f"已写入{n}行：{file_prefix} {label}")
+        else:
+            print(f"{label} 无数据")
     except Exception as e:
-        print(f"{s_str}-{e_str} 获取失败: {e}")
-    time.sleep(3)  # 避免请求过快
\ No newline at end of file
+        print(f"{label} 获取失败: {e}")
+        continue
+    # 下载失败的(日期, 品种)不记入清单，下次运行时只重新抓取这些
+    for symbol in batch_symbols:
+        done_dates = [d for d in run if (d, symbol) not in failed]
+        manifest.mark_done(file_prefix, symbol, rows_per_day(df, done_dates, symbol))
+
+print(manifest.summary(file_prefix))
+manifest.close()
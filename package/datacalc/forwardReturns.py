@@ -0,0 +1,112 @@
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# 买入手续费率
+BUY_FEE = 0.0005
+
+
+def _group_end(codes):
+    """
+    每行所属股票的结束位置（不含），codes需已按股票代码排序，同一股票的行连续
+    :return: int64数组
+    """
+    codes = np.asarray(codes)
+    n = len(codes)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], n]
+    return np.repeat(ends, ends - starts).astype(np.int64)
+
+
+def _forward_returns_loop(limit_flags, open_prices, close_prices, group_end, horizons, fee):
+    """
+    逐行计算未舍入的未来收益率，供numba编译；当日涨停为0.0，无法计算为NaN
+    从后往前遍历，next_tradable为当日及之后首个非涨停日
+    """
+    n = len(limit_flags)
+    out = np.full((n, len(horizons)), np.nan)
+    next_tradable = n
+    for i in range(n - 1, -1, -1):
+        end = group_end[i]
+        if i == end - 1:
+            next_tradable = end
+        if limit_flags[i] != 1:
+            next_tradable = i
+        base = next_tradable + 1
+        if base >= end:
+            continue
+        buy_cost = open_prices[base] * (1 + fee)
+        for k in range(len(horizons)):
+            target = i + horizons[k]
+            if target >= end:
+                continue
+            if limit_flags[i] == 1:
+                out[i, k] = 0.0
+            elif buy_cost != 0 and not np.isnan(buy_cost):
+                out[i, k] = close_prices[target] / buy_cost - 1
+    return out
+
+
+_forward_returns_numba = numba.njit(cache=True)(_forward_returns_loop) if numba is not None else None
+
+
+def _forward_returns_numpy(limit_flags, open_prices, close_prices, group_end, horizons, fee):
+    """数组实现，结果与_forward_returns_loop相同"""
+    n = len(limit_flags)
+    rows = np.arange(n)
+    # 当日及之后首个非涨停日；跨到下一只股票时必然不小于本股票的结束位置，下面统一视为无法买入
+    pos = np.where(limit_flags != 1, rows, n)
+    next_tradable = np.minimum.accumulate(pos[::-1])[::-1]
+    base = next_tradable + 1
+    has_base = base < group_end
+    buy_cost = np.full(n, np.nan)
+    buy_cost[has_base] = open_prices[base[has_base]] * (1 + fee)
+    # 全部周期一次取数
+    targets = rows[:, None] + horizons[None, :]
+    valid = has_base[:, None] & (targets < group_end[:, None])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = close_prices[np.minimum(targets, n - 1)] / buy_cost[:, None] - 1
+    out[buy_cost == 0] = np.nan
+    out[limit_flags == 1] = 0.0
+    out[~valid] = np.nan
+    return out
+
+
+def calc_forward_returns(codes, limit_flags, open_prices, close_prices, horizons, fee=BUY_FEE, ndigits=4, engine='auto'):
+    """
+    计算多个周期的未来收益率，数据需已按股票代码、日期排序
+    第i日的买入日为i+1日起、前一日不涨停的首个交易日，按买入日开盘价加手续费买入，
+    周期N的收益率为 round(第i+N日收盘价 / 买入成本 - 1, ndigits)；
+    当日涨停的收益率为0.0，本股票内没有买入日、第i+N日超出本股票数据范围、买入成本为0时为NaN
+    舍入与原逐元素round(np.float64, ndigits)相同，即np.round
+    :param codes: 股票代码序列，用于划分每只股票的数据范围
+    :param limit_flags: 是否涨跌停，1为涨停
+    :param open_prices: 开盘价
+    :param close_prices: 收盘价
+    :param horizons: 周期列表（交易日数），如[1, 2, 3, 4, 5]
+    :param fee: 买入手续费率
+    :param ndigits: 收益率保留的小数位数
+    :param engine: 'numpy'、'numba'，'auto'在安装了numba时使用numba
+    :return: float64数组，形状为(行数, 周期数)
+    """
+    if engine == 'auto':
+        engine = 'numba' if numba is not None else 'numpy'
+    if engine not in ('numpy', 'numba'):
+        raise ValueError("engine 仅支持 'auto', 'numpy', 'numba'")
+    if engine == 'numba' and numba is None:
+        raise ImportError("engine='numba' 需要安装numba")
+    limit_flags = np.asarray(limit_flags, dtype=np.int64)
+    open_prices = np.asarray(open_prices, dtype=np.float64)
+    close_prices = np.asarray(close_prices, dtype=np.float64)
+    horizons = np.asarray(horizons, dtype=np.int64)
+    group_end = _group_end(codes)
+    if len(limit_flags) == 0:
+        return np.zeros((0, len(horizons)))
+    kernel = _forward_returns_numba if engine == 'numba' else _forward_returns_numpy
+    out = kernel(limit_flags, open_prices, close_prices, group_end, horizons, float(fee))
+    return np.round(out, ndigits)
@@ -0,0 +1,31 @@
+import numpy as np
+from package.datacalc.rounding import round_like_python
+
+# 涨跌停价相对前收盘价的比例
+LIMIT_UP_RATIO = 1.044
+LIMIT_DOWN_RATIO = 0.956
+
+
+def calc_limit_status(high, low, pre_close, up_ratio=LIMIT_UP_RATIO, down_ratio=LIMIT_DOWN_RATIO):
+    """
+    向量化计算是否涨跌停：一字板（最高价等于最低价）且最高价不低于round(前收盘价*up_ratio, 2)为1，
+    否则一字板且最低价不高于round(前收盘价*down_ratio, 2)为-1，其余（含前收盘价缺失）为0
+    舍入与Python内置round一致，结果与逐行判断完全相同
+    :param high: 最高价序列
+    :param low: 最低价序列
+    :param pre_close: 前收盘价序列，缺失为NaN
+    :return: int64数组
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    pre_close = np.asarray(pre_close, dtype=np.float64)
+    up_price = round_like_python(pre_close * up_ratio, 2)
+    down_price = round_like_python(pre_close * down_ratio, 2)
+    # NaN参与的比较均为False，前收盘价缺失时自然为0
+    one_price = high == low
+    return np.select(
+        [one_price & (high >= up_price), one_price & (low <= down_price)],
+        [1, -1],
+        default=0,
+    ).astype(np.int64)
+
@@ -0,0 +1,259 @@
+import os
+import glob
+import json
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# 每个年份分区只有一个文件，整体替换
+PARTITION_FILE = 'data.parquet'
+_HEX_DIGITS = np.array(list('0123456789abcdef'))
+# schema元数据中记录数组列周期标签的键，值为 {列名: 标签列表} 的json
+HORIZON_METADATA_KEY = b'horizons'
+
+
+def hash_rows(df):
+    """
+    逐行内容哈希，按列向量化计算（pd.util.hash_pandas_object，不含索引），结果与行的位置无关
+    :param df: 参与哈希的列，只能是标量列
+    :return: 16位十六进制字符串数组
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+    # uint64按大端拆成8个字节，每个字节两个十六进制字符，整体按16字符视图读出
+    nibbles = hashes.astype('>u8').view(np.uint8).reshape(-1, 8)
+    chars = _HEX_DIGITS[np.stack([nibbles >> 4, nibbles & 15], axis=-1).reshape(-1, 16)]
+    return chars.view('<U16').ravel().astype(object)
+
+
+def array_column_names(name, labels):
+    """数组列在DataFrame中展开后的各列列名，如 未来收益率[5]"""
+    return [f"{name}[{label}]" for label in labels]
+
+
+def horizon_array(values):
+    """
+    二维数组转换为FixedSizeList<float32>列，每行一个定长数组
+    float32且C连续的输入不复制，NaN按值保存
+    :param values: 形状为(行数, 周期数)的数组
+    :return: pa.FixedSizeListArray
+    """
+    values = np.ascontiguousarray(values, dtype=np.float32)
+    return pa.FixedSizeListArray.from_arrays(pa.array(values.ravel()), values.shape[1])
+
+
+def add_horizon_columns(table, arrays):
+    """
+    向Arrow表追加FixedSizeList<float32>数组列，周期标签只在schema元数据中记录一次
+    :param table: pa.Table
+    :param arrays: {列名: (二维数组, 周期标签列表)}
+    :return: pa.Table
+    """
+    metadata = dict(table.schema.metadata or {})
+    labels = json.loads(metadata.get(HORIZON_METADATA_KEY, b'{}'))
+    for name, (values, column_labels) in arrays.items():
+        column_labels = [str(x) for x in column_labels]
+        if np.shape(values)[1] != len(column_labels):
+            raise ValueError(f"{name} 的列数与周期标签数量不一致")
+        table = table.append_column(name, horizon_array(values))
+        labels[name] = column_labels
+    metadata[HORIZON_METADATA_KEY] = json.dumps(labels, ensure_ascii=False).encode('utf-8')
+    return table.replace_schema_metadata(metadata)
+
+
+def horizon_labels(schema):
+    """schema元数据中的周期标签，{列名: 标签列表}"""
+    return json.loads((schema.metadata or {}).get(HORIZON_METADATA_KEY, b'{}'))
+
+
+def read_horizon_array(table, name, n_labels=None):
+    """
+    数组列读回为二维数组，按列整体展开，不逐行遍历
+    兼容旧版的变长list列，此时各行长度必须相同
+    :param table: pa.Table
+    :param name: 列名
+    :param n_labels: 没有元数据的旧版list列的周期数，默认按首行长度
+    :return: (二维数组, 周期标签列表)，标签未记录时为None
+    """
+    column = table.column(name)
+    labels = horizon_labels(table.schema).get(name)
+    if pa.types.is_fixed_size_list(column.type):
+        width = column.type.list_size
+    else:
+        lengths = pc.list_value_length(column)
+        if len(column) and n_labels is None:
+            n_labels = lengths[0].as_py()
+        if len(column) and not pc.all(pc.equal(lengths, n_labels)).as_py():
+            raise ValueError(f"{name} 各行的数组长度不一致")
+        width = n_labels or 0
+    chunks = [chunk.flatten().to_numpy(zero_copy_only=False) for chunk in column.chunks]
+    flat = np.concatenate(chunks) if chunks else np.zeros(0)
+    return flat.reshape(len(column), width), labels
+
+
+class ResultStore:
+    """
+    按 年份=YYYY 分区的结果数据集，按主键合并写入
+    写入时与已有数据按主键比对版本哈希：新主键插入，哈希变化的行替换，哈希相同的行保留原数据（含入库时间）；
+    分区没有变化时不写盘，有变化时整个分区写为单个文件，先写临时文件再改名
+    重复运行结果不变，只有变化的分区被重写；重写的分区按本次写入数据的字段保存，旧数据中多余的字段被删除
+    :param root: 数据集根目录
+    :param keys: 主键列
+    :param partition_col: 分区列，取值为年份字符串
+    :param hash_col: 版本哈希列
+    :param array_columns: 数组列 {列名: 周期标签列表}，DataFrame中按array_column_names展开为多列，
+                          写入时合并为FixedSizeList<float32>列，标签保存在schema元数据中
+    """
+    def __init__(self, root, keys=('日期', '股票代码'), partition_col='年份', hash_col='版本哈希', array_columns=None):
+        self.root = root
+        self.keys = list(keys)
+        self.partition_col = partition_col
+        self.hash_col = hash_col
+        self.array_columns = {name: [str(x) for x in labels] for name, labels in (array_columns or {}).items()}
+        os.makedirs(root, exist_ok=True)
+
+    def _partition_dir(self, partition):
+        return os.path.join(self.root, f"{self.partition_col}={partition}")
+
+    def _partition_files(self, partition):
+        return sorted(glob.glob(os.path.join(self._partition_dir(partition), "*.parquet")))
+
+    def partitions(self):
+        """已有数据的分区取值列表"""
+        pattern = os.path.join(self.root, f"{self.partition_col}=*")
+        return sorted(os.path.basename(p).split('=', 1)[1] for p in glob.glob(pattern))
+
+    def _to_frame(self, table):
+        """Arrow表转换为DataFrame，数组列展开为多列"""
+        arrays = {}
+        for name, labels in self.array_columns.items():
+            if name not in table.column_names:
+                continue
+            values, stored = read_horizon_array(table, name, len(labels))
+            if stored is not None and stored != labels:
+                raise ValueError(f"{name} 的周期标签{stored}与配置{labels}不一致")
+            arrays[name] = values
+            table = table.drop_columns([name])
+        df = table.to_pandas()
+        for name, values in arrays.items():
+            df[array_column_names(name, self.array_columns[name])] = values
+        return df
+
+    def _to_table(self, df):
+        """DataFrame转换为Arrow表，展开的数组列合并为FixedSizeList列"""
+        arrays = {}
+        for name, labels in self.array_columns.items():
+            names = array_column_names(name, labels)
+            if set(names) <= set(df.columns):
+                arrays[name] = (df[names].to_numpy(dtype=np.float32), labels)
+                df = df.drop(columns=names)
+        table = pa.Table.from_pandas(df.set_index(self.keys), preserve_index=True)
+        return add_horizon_columns(table, arrays) if arrays else table
+
+    def _read_partition(self, partition):
+        """
+        读取分区为DataFrame，主键为普通列
+        兼容旧版按分区追加写入的多个文件，保留各文件的顺序以便按主键取最后写入的行
+        """
+        files = self._partition_files(partition)
+        if not files:
+            return None
+        # 旧版追加写入的文件名是随机的，按修改时间排序
+        files.sort(key=os.path.getmtime)
+        frames = [self._to_frame(pq.read_table(f)) for f in files]
+        df = pd.concat(frames, ignore_index=False)
+        if set(self.keys) <= set(df.index.names):
+            df = df.reset_index()
+        return df.reset_index(drop=True)
+
+    def _is_current(self, partition):
+        """分区为单个文件，且数组列均为定长数组"""
+        files = self._partition_files(partition)
+        if len(files) != 1:
+            return False
+        schema = pq.read_schema(files[0])
+        return all(
+            pa.types.is_fixed_size_list(schema.field(name).type)
+            for name in self.array_columns if name in schema.names
+        )
+
+    def _write_partition(self, partition, df):
+        """分区写为单个文件，就位后删除该分区的其他文件"""
+        part_dir = self._partition_dir(partition)
+        os.makedirs(part_dir, exist_ok=True)
+        old_files = [f for f in self._partition_files(partition) if os.path.basename(f) != PARTITION_FILE]
+        table = self._to_table(df)
+        # 临时文件以.开头，读取数据集时会被忽略
+        tmp_path = os.path.join(part_dir, f".{uuid.uuid4().hex}.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(part_dir, PARTITION_FILE))
+        for f in old_files:
+            os.remove(f)
+
+    def upsert(self, df):
+        """
+        按主键合并写入
+        :param df: 含主键（列或索引）、分区列和版本哈希列的DataFrame
+        :return: dict，inserted新增行数、updated替换行数、unchanged未变化行数、written重写的分区数
+        """
+        if set(self.keys) <= set(df.index.names):
+            df = df.reset_index()
+        stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'written': 0}
+        for partition, new in df.groupby(self.partition_col, sort=True):
+            new = new.drop(columns=self.partition_col).drop_duplicates(self.keys, keep='last')
+            old = self._read_partition(partition)
+            if old is None:
+                stats['inserted'] += len(new)
+                stats['written'] += 1
+                self._write_partition(partition, new.sort_values(self.keys, kind='stable'))
+                continue
+
+            # 字段以本次写入的数据为准
+            same_columns = set(old.columns) == set(new.columns)
+            old = old.reindex(columns=new.columns)
+            # 旧版重复追加的行按主键只保留最后一次写入
+            duplicated = old.duplicated(self.keys, keep='last')
+            old = old[~duplicated]
+            for k in self.keys:
+                if old[k].dtype != new[k].dtype:
+                    old[k] = old[k].astype(new[k].dtype)
+            merged = new[self.keys + [self.hash_col]].merge(
+                old[self.keys + [self.hash_col]], on=self.keys, how='left', suffixes=('', '_old')
+            )
+            existed = merged[f'{self.hash_col}_old'].notna().to_numpy()
+            changed = (merged[self.hash_col] != merged[f'{self.hash_col}_old']).to_numpy()
+            stats['inserted'] += int((~existed).sum())
+            stats['updated'] += int((existed & changed).sum())
+            stats['unchanged'] += int((~changed).sum())
+            if not changed.any() and not duplicated.any() and same_columns and self._is_current(partition):
+                continue
+
+            stats['written'] += 1
+            combined = pd.concat([old, new[changed]], ignore_index=True)
+            combined = combined.drop_duplicates(self.keys, keep='last').sort_values(self.keys, kind='stable')
+            self._write_partition(partition, combined)
+        return stats
+
+    def read(self, partitions=None, columns=None):
+        """
+        读取为DataFrame，索引为主键
+        :param partitions: 分区取值列表，如['2023', '2024']，默认全部
+        :param columns: 需要读取的字段（不含主键），数组列按列名读取，默认全部
+        :return: DataFrame，数组列展开为多列，无数据时为空DataFrame
+        """
+        partitions = self.partitions() if partitions is None else [str(p) for p in partitions]
+        frames = []
+        for partition in partitions:
+            for f in self._partition_files(partition):
+                read_cols = None if columns is None else self.keys + list(columns)
+                df = self._to_frame(pq.read_table(f, columns=read_cols))
+                if set(self.keys) <= set(df.columns):
+                    df = df.set_index(self.keys)
+                df[self.partition_col] = partition
+                frames.append(df)
+        if not frames:
+            print(f"{self.root} 没有找到指定分区的数据。")
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames)
@@ -0,0 +1,23 @@
+import numpy as np
+
+
+def round_like_python(values, ndigits=0):
+    """
+    向量化的四舍五入，结果与逐个调用Python内置round(x, ndigits)完全一致
+    np.round先乘10**ndigits再取整，乘法的舍入误差会让接近0.5的值舍入方向与round不同
+    （如round(2.675, 2)为2.67，np.round为2.68），这类值单独用round重算
+    :param values: 浮点数组或序列
+    :param ndigits: 保留的小数位数，非负整数
+    :return: float64数组
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scale = 10.0 ** ndigits
+    with np.errstate(invalid='ignore', over='ignore'):
+        scaled = values * scale
+        result = np.round(values, ndigits)
+        # 小数部分接近0.5的值，容差远大于乘法的舍入误差
+        frac = scaled - np.floor(scaled)
+        near_half = np.abs(frac - 0.5) <= 1e-9 * np.maximum(1.0, np.abs(scaled))
+    for i in np.flatnonzero(near_half):
+        result.flat[i] = round(float(values.flat[i]), ndigits)
+    return result
@@ -0,0 +1,437 @@
+import re
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 因子表达式：alpha101风格的算子，在(日期 × 股票)的二维数组上计算
+# 时间序列算子沿日期方向按行计算，窗口内有缺失值时结果为NaN；截面算子按日期逐行计算
+
+_TOKEN = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)|([A-Za-z_]\w*)|(<=|>=|==|!=|&&|\|\||[-+*/^(),?:<>]))")
+
+# 内置的衍生字段，数据中没有该字段时按表达式计算
+DERIVED_FIELDS = {
+    'returns': 'close / delay(close, 1) - 1',
+}
+
+# 时间序列算子窗口展开后每批计算的元素数上限，控制中间数组的内存
+_CHUNK_ELEMENTS = 1 << 24
+
+
+def _tokenize(formula):
+    tokens = []
+    pos = 0
+    formula = formula.rstrip()
+    while pos < len(formula):
+        m = _TOKEN.match(formula, pos)
+        if m is None:
+            raise ValueError(f"无法解析的字符：{formula[pos:pos + 10]!r}")
+        number, name, op = m.groups()
+        if number is not None:
+            tokens.append(('num', float(number)))
+        elif name is not None:
+            tokens.append(('name', name))
+        else:
+            tokens.append(('op', op))
+        pos = m.end()
+    tokens.append(('end', None))
+    return tokens
+
+
+class _Parser:
+    """
+    递归下降解析，优先级从低到高：
+    ?: 、||、&&、比较（< > <= >= == !=）、+ -、* /、一元负号、^（右结合）、函数调用/括号
+    节点为元组：('const', 值)、('var', 字段名)、('call', 算子名, (参数节点, ...))
+    """
+    def __init__(self, formula):
+        self.tokens = _tokenize(formula)
+        self.i = 0
+
+    def peek(self):
+        return self.tokens[self.i]
+
+    def take(self, op=None):
+        token = self.tokens[self.i]
+        if op is not None and token != ('op', op):
+            raise ValueError(f"期望 {op!r}，实际为 {token[1]!r}")
+        self.i += 1
+        return token
+
+    def parse(self):
+        node = self.ternary()
+        if self.peek()[0] != 'end':
+            raise ValueError(f"多余的内容：{self.peek()[1]!r}")
+        return node
+
+    def ternary(self):
+        cond = self.binary(0)
+        if self.peek() == ('op', '?'):
+            self.take('?')
+            a = self.ternary()
+            self.take(':')
+            b = self.ternary()
+            return _call('where', cond, a, b)
+        return cond
+
+    _LEVELS = [('||',), ('&&',), ('<', '>', '<=', '>=', '==', '!='), ('+', '-'), ('*', '/')]
+
+    def binary(self, level):
+        if level == len(self._LEVELS):
+            return self.unary()
+        node = self.binary(level + 1)
+        while self.peek()[0] == 'op' and self.peek()[1] in self._LEVELS[level]:
+            op = self.take()[1]
+            node = _call(op, node, self.binary(level + 1))
+        return node
+
+    def unary(self):
+        if self.peek() == ('op', '-'):
+            self.take('-')
+            operand = self.unary()
+            if operand[0] == 'const':
+                return ('const', -operand[1])
+            return _call('neg', operand)
+        if self.peek() == ('op', '+'):
+            self.take('+')
+            return self.unary()
+        return self.power()
+
+    def power(self):
+        base = self.primary()
+        if self.peek() == ('op', '^'):
+            self.take('^')
+            return _call('^', base, self.unary())
+        return base
+
+    def primary(self):
+        kind, value = self.take()
+        if kind == 'num':
+            return ('const', value)
+        if kind == 'name':
+            if self.peek() != ('op', '('):
+                return ('var', value)
+            self.take('(')
+            args = []
+            if self.peek() != ('op', ')'):
+                args.append(self.ternary())
+                while self.peek() == ('op', ','):
+                    self.take(',')
+                    args.append(self.ternary())
+            self.take(')')
+            return _call(value.lower(), *args)
+        if (kind, value) == ('op', '('):
+            node = self.ternary()
+            self.take(')')
+            return node
+        if kind == 'end':
+            raise ValueError("表达式不完整")
+        raise ValueError(f"无法解析：{value!r}")
+
+
+def _call(name, *args):
+    """构造算子节点；可交换的二元运算按参数排序，使 a*b 与 b*a 成为同一个公共子表达式"""
+    name = _ALIASES.get(name, name)
+    # min/max最后一个参数为常数时是时间序列算子，否则为逐元素的较小/较大值
+    if name in ('min', 'max'):
+        if len(args) == 2 and args[1][0] == 'const':
+            name = 'ts_' + name
+        else:
+            name = {'min': 'minimum', 'max': 'maximum'}[name]
+    if name in ('+', '*', 'minimum', 'maximum') and repr(args[1]) < repr(args[0]):
+        args = (args[1], args[0])
+    return ('call', name, tuple(args))
+
+
+def parse(formula):
+    """
+    解析因子表达式
+    :param formula: 如 '-1*rank(ts_sum(open,5)*ts_sum(returns,5) - delay(ts_sum(open,5)*ts_sum(returns,5),10))'
+    :return: 表达式树（嵌套元组），相同的子表达式对应相等的元组
+    """
+    return _Parser(formula).parse()
+
+
+# ---------- 算子 ----------
+
+def _window(d):
+    """窗口长度，alpha101中非整数窗口向下取整"""
+    d = int(np.floor(d))
+    if d < 1:
+        raise ValueError(f"窗口长度必须不小于1：{d}")
+    return d
+
+
+def _pad(result, d):
+    """时间序列结果前d-1行补NaN，恢复为原行数"""
+    head = np.full((d - 1,) + result.shape[1:], np.nan)
+    return np.concatenate([head, result], axis=0)
+
+
+def _rolling(x, d, func):
+    """
+    沿日期方向的滑动窗口计算，窗口视图不复制数据，分批计算以限制func中间数组的大小
+    :param func: 输入(批行数, 股票数, d)的窗口，返回(批行数, 股票数)
+    """
+    d = _window(d)
+    if d > len(x):
+        return np.full(x.shape, np.nan)
+    view = sliding_window_view(x, d, axis=0)
+    step = max(1, _CHUNK_ELEMENTS // max(1, x.shape[1] * d))
+    out = np.concatenate([func(view[i:i + step]) for i in range(0, len(view), step)], axis=0)
+    return _pad(out, d)
+
+
+def delay(x, d):
+    d = int(np.floor(d))
+    out = np.full(x.shape, np.nan)
+    if d < len(x):
+        out[d:] = x[:len(x) - d]
+    return out
+
+
+def delta(x, d):
+    return x - delay(x, d)
+
+
+def ts_sum(x, d):
+    return _rolling(x, d, lambda w: w.sum(axis=-1))
+
+
+def ts_mean(x, d):
+    return ts_sum(x, d) / _window(d)
+
+
+def ts_min(x, d):
+    return _rolling(x, d, lambda w: w.min(axis=-1))
+
+
+def ts_max(x, d):
+    return _rolling(x, d, lambda w: w.max(axis=-1))
+
+
+def _nan_windows(w, result):
+    """窗口内有NaN时结果为NaN"""
+    return np.where(np.isnan(w).any(axis=-1), np.nan, result)
+
+
+def ts_argmax(x, d):
+    """窗口内最大值的位置，1为窗口最早一天"""
+    return _rolling(x, d, lambda w: _nan_windows(w, w.argmax(axis=-1) + 1.0))
+
+
+def ts_argmin(x, d):
+    return _rolling(x, d, lambda w: _nan_windows(w, w.argmin(axis=-1) + 1.0))
+
+
+def ts_rank(x, d):
+    """当日值在过去d天中的百分位排名，相同值取平均排名"""
+    d = _window(d)
+
+    def rank_last(w):
+        last = w[..., -1:]
+        below = (w < last).sum(axis=-1)
+        equal = (w == last).sum(axis=-1)
+        return _nan_windows(w, (below + (equal + 1) / 2) / d)
+    return _rolling(x, d, rank_last)
+
+
+def _demean(x):
+    """减去每只股票的全样本均值，方差、协方差不变，减小用窗口和计算时的舍入误差"""
+    with np.errstate(invalid='ignore'):
+        mean = np.nanmean(x, axis=0) if len(x) else np.zeros(x.shape[1:])
+    return x - np.nan_to_num(mean)
+
+
+def ts_cov(x, y, d):
+    """样本协方差（ddof=1）"""
+    d = _window(d)
+    x, y = _demean(x), _demean(y)
+    return (ts_sum(x * y, d) - ts_sum(x, d) * ts_sum(y, d) / d) / (d - 1)
+
+
+def stddev(x, d):
+    """样本标准差（ddof=1）"""
+    d = _window(d)
+    x = _demean(x)
+    var = (ts_sum(x * x, d) - ts_sum(x, d) ** 2 / d) / (d - 1)
+    return np.sqrt(np.maximum(var, 0))
+
+
+def ts_corr(x, y, d):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = ts_cov(x, y, d) / (stddev(x, d) * stddev(y, d))
+    # 标准差为0时相关系数无定义
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def decay_linear(x, d):
+    """线性衰减加权平均，权重d, d-1, ..., 1，当日权重最大"""
+    d = _window(d)
+    weights = np.arange(1, d + 1, dtype=np.float64)
+    weights /= weights.sum()
+    return _rolling(x, d, lambda w: w @ weights)
+
+
+def rank(x):
+    """截面百分位排名，相同值取平均排名，NaN不参与排名"""
+    return pd.DataFrame(x).rank(axis=1, method='average', pct=True).to_numpy()
+
+
+def scale(x, a=1.0):
+    """截面缩放，使每日绝对值之和为a"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return x * a / np.nansum(np.abs(x), axis=1, keepdims=True)
+
+
+def signedpower(x, a):
+    return np.sign(x) * np.abs(x) ** a
+
+
+def _log(x):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.log(x)
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def _compare(op):
+    def func(a, b):
+        a, b = np.broadcast_arrays(a, b)
+        with np.errstate(invalid='ignore'):
+            out = op(a, b).astype(np.float64)
+        out[np.isnan(a) | np.isnan(b)] = np.nan
+        return out
+    return func
+
+
+def _divide(a, b):
+    """除数为0时为NaN"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out = np.true_divide(a, b)
+    return np.where(np.isinf(out), np.nan, out)
+
+
+def _where(cond, a, b):
+    # 两个分支都是常数时形状由条件决定，三者一起广播
+    cond, a, b = np.broadcast_arrays(cond, a, b)
+    return np.where(np.isnan(cond), np.nan, np.where(cond != 0, a, b))
+
+
+OPERATORS = {
+    '+': np.add, '-': np.subtract, '*': np.multiply, '/': _divide, '^': np.power,
+    'neg': np.negative,
+    '<': _compare(np.less), '>': _compare(np.greater), '<=': _compare(np.less_equal),
+    '>=': _compare(np.greater_equal), '==': _compare(np.equal), '!=': _compare(np.not_equal),
+    '&&': _compare(lambda a, b: (a != 0) & (b != 0)), '||': _compare(lambda a, b: (a != 0) | (b != 0)),
+    'where': _where,
+    'delay': delay, 'delta': delta, 'ts_sum': ts_sum, 'ts_mean': ts_mean, 'ts_min': ts_min, 'ts_max': ts_max,
+    'ts_argmax': ts_argmax, 'ts_argmin': ts_argmin, 'ts_rank': ts_rank, 'ts_corr': ts_corr, 'ts_cov': ts_cov,
+    'stddev': stddev, 'decay_linear': decay_linear, 'rank': rank, 'scale': scale, 'signedpower': signedpower,
+    'abs': np.abs, 'log': _log, 'sign': np.sign, 'minimum': np.minimum, 'maximum': np.maximum,
+}
+# 这些算子的最后一个参数为窗口长度或系数，必须是常数
+_CONST_ARGS = {
+    'delay': 1, 'delta': 1, 'ts_sum': 1, 'ts_mean': 1, 'ts_min': 1, 'ts_max': 1, 'ts_argmax': 1, 'ts_argmin': 1,
+    'ts_rank': 1, 'ts_corr': 1, 'ts_cov': 1, 'stddev': 1, 'decay_linear': 1, 'scale': 1, 'signedpower': 1,
+}
+_ALIASES = {
+    'sum': 'ts_sum', 'sma': 'ts_mean', 'correlation': 'ts_corr', 'covariance': 'ts_cov', 'ts_std': 'stddev',
+    'ts_stddev': 'stddev',
+}
+
+
+class FactorPanel:
+    """
+    在(日期 × 股票)的二维数组上计算因子表达式
+    同一个FactorPanel上计算的所有表达式共享子表达式缓存，相同的子表达式只计算一次
+    :param fields: {字段名: 二维数组}，形状均为(日期数, 股票数)，缺失为NaN
+    :param dates: 日期索引，可选
+    :param codes: 股票代码索引，可选
+    """
+    def __init__(self, fields, dates=None, codes=None):
+        self.fields = {k: np.asarray(v, dtype=np.float64) for k, v in fields.items()}
+        shapes = {v.shape for v in self.fields.values()}
+        if len(shapes) > 1:
+            raise ValueError(f"字段的形状不一致：{shapes}")
+        self.shape = shapes.pop() if shapes else (0, 0)
+        self.dates = dates
+        self.codes = codes
+        self._rows = None
+        self._cols = None
+        self._cache = {}
+
+    @classmethod
+    def from_frame(cls, df, fields=None, date_col='date', code_col='code'):
+        """
+        由长表（每行一只股票一天）构造，不在df中的(日期, 股票)为NaN
+        :param fields: 需要的字段，默认除日期、代码外的全部数值列
+        :return: FactorPanel，to_long可把结果按df的行顺序取回
+        """
+        if fields is None:
+            fields = [c for c in df.select_dtypes('number').columns if c not in (date_col, code_col)]
+        rows, dates = pd.factorize(df[date_col], sort=True)
+        cols, codes = pd.factorize(df[code_col], sort=True)
+        arrays = {}
+        for field in fields:
+            values = np.full((len(dates), len(codes)), np.nan)
+            values[rows, cols] = df[field].to_numpy(dtype=np.float64)
+            arrays[field] = values
+        panel = cls(arrays, dates=dates, codes=codes)
+        panel._rows, panel._cols = rows, cols
+        return panel
+
+    def to_long(self, values):
+        """二维结果按from_frame时df的行顺序展开为一维数组"""
+        if self._rows is None:
+            raise ValueError("只有from_frame构造的FactorPanel可以展开为长表")
+        return values[self._rows, self._cols]
+
+    def evaluate(self, formula):
+        """
+        计算因子表达式
+        :param formula: 表达式字符串或parse的结果
+        :return: 二维数组，形状为(日期数, 股票数)；不要原地修改，结果在缓存中共享
+        """
+        node = parse(formula) if isinstance(formula, str) else formula
+        return np.broadcast_to(self._eval(node), self.shape)
+
+    def evaluate_many(self, formulas):
+        """
+        计算多个因子，不同因子间相同的子表达式也只计算一次
+        :param formulas: {因子名: 表达式}
+        :return: {因子名: 二维数组}
+        """
+        return {name: self.evaluate(formula) for name, formula in formulas.items()}
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def _eval(self, node):
+        if node in self._cache:
+            return self._cache[node]
+        kind = node[0]
+        if kind == 'const':
+            result = np.float64(node[1])
+        elif kind == 'var':
+            name = node[1]
+            if name in self.fields:
+                result = self.fields[name]
+            elif name in DERIVED_FIELDS:
+                result = self._eval(parse(DERIVED_FIELDS[name]))
+            else:
+                raise KeyError(f"未知字段：{name}")
+        else:
+            _, name, args = node
+            if name not in OPERATORS:
+                raise ValueError(f"未知算子：{name}")
+            # scale的系数可以省略
+            n_const = min(_CONST_ARGS.get(name, 0), len(args) - 1)
+            values = [self._eval(a) for a in args[:len(args) - n_const]]
+            for a in args[len(args) - n_const:]:
+                if a[0] != 'const':
+                    raise ValueError(f"{name} 的窗口长度或系数必须是常数")
+                values.append(a[1])
+            result = OPERATORS[name](*values)
+        self._cache[node] = result
+        return result
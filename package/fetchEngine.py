@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+from tqdm import tqdm
+
+
+class TokenBucket:
+    """
+    令牌桶限速器（线程安全）
+    :param rate: 每秒补充的令牌数，即稳定状态下每秒允许的请求数
+    :param capacity: 桶容量，即允许的突发请求数
+    """
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("rate 必须大于0")
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一个令牌，令牌不足时阻塞等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """
+    按交易所域名分别限速，不同域名互不阻塞
+    :param default_rate: 未单独配置的域名每秒允许的请求数
+    :param rates: dict，{域名: 每秒请求数}，如 {'query.sse.com.cn': 5}
+    :param capacity: 每个域名的突发请求数
+    """
+    def __init__(self, default_rate=5.0, rates=None, capacity=1):
+        self.default_rate = default_rate
+        self.rates = dict(rates or {})
+        self.capacity = capacity
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host):
+        with self._lock:
+            if host not in self._buckets:
+                rate = self.rates.get(host, self.default_rate)
+                self._buckets[host] = TokenBucket(rate, self.capacity)
+            return self._buckets[host]
+
+    def acquire(self, url):
+        """按url所属域名取得令牌"""
+        self.bucket(urlparse(url).netloc).acquire()
+
+
+def run_ordered(func, items, max_workers=4, desc=None):
+    """
+    用线程池并发执行func(item)，结果按items原顺序返回
+    :param func: 单个任务函数，异常需在函数内部自行处理
+    :param items: 任务参数列表
+    :param max_workers: 最大并发数，<=1时顺序执行
+    :param desc: tqdm进度条描述，None则不显示进度条
+    :return: list，与items一一对应的结果
+    """
+    items = list(items)
+    results = [None] * len(items)
+    pbar = tqdm(total=len(items), desc=desc) if desc is not None else None
+    if max_workers is None or max_workers <= 1 or len(items) <= 1:
+        for i, item in enumerate(items):
+            results[i] = func(item)
+            if pbar is not None:
+                pbar.update(1)
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(func, item): i for i, item in enumerate(items)}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                if pbar is not None:
+                    pbar.update(1)
+    if pbar is not None:
+        pbar.close()
+    return results
@@ -1,11 +1,32 @@
+import numpy as np
 import pandas as pd
-import datetime
-import calendar
+from .tradeCalendar import TradeCalendar
+
+# 排名数据的三个统计维度：(统计维度, 会员简称列, 数值列, 增减列)
+RANK_DIMENSIONS = [
+    ('成交量', '成交量-会员简称', '成交量-成交量', '成交量-比上一交易日增减'),
+    ('持买单量', '买单-会员简称', '买单-持买单量', '买单-比上一交易日增减'),
+    ('持卖单量', '卖单-会员简称', '卖单-持卖单量', '卖单-比上一交易日增减'),
+]
+# process_original_format中各维度的输出列：(排名, 数值, 增减, 增减比例)，与RANK_DIMENSIONS顺序一致
+ORIGINAL_FORMAT_COLUMNS = [
+    ('成交量排名', '成交量', '成交量-比上一交易日增减', '成交量-比上一交易日增减比例'),
+    ('买单排名', '买单-持买单量', '买单-比上一交易日增减', '买单-比上一交易日增减比例'),
+    ('卖单排名', '卖单-持卖单量', '卖单-比上一交易日增减', '卖单-比上一交易日增减比例'),
+]
 
 class FoDataProcessor:
-    def __init__(self):
+    def __init__(self, calendar=None, members=None):
+        """
+        :param calendar: TradeCalendar，用于把遇节假日的到期日顺延到下一交易日，默认在首次使用时由本地行情数据构建
+        :param members: MemberDictionary，排名数据为'成交量-会员ID'等会员ID列时用于解码公司简称
+        """
         # 不再在初始化时接收df
-        pass
+        self.calendar = calendar
+        self.members = members
+        # 到期日表：_expiry[i]为第(_expiry_base + i)个月（年 * 12 + 月 - 1）的到期日
+        self._expiry_base = None
+        self._expiry = np.array([], dtype='datetime64[D]')
         
     def _clean_data(self, df):
         """Clean and preprocess the raw data"""
@@ -26,183 +47,223 @@ class FoDataProcessor:
             return ''
         return ''.join(str(name).split())
 
+    def _expiry_table(self, first_ym, last_ym):
+        """
+        Make sure the expiry table covers months [first_ym, last_ym] (year * 12 + month - 1)
+        到期日为当月第三个周五，遇节假日顺延至下一交易日
+        """
+        if self._expiry_base is not None:
+            last_known = self._expiry_base + len(self._expiry) - 1
+            if first_ym >= self._expiry_base and last_ym <= last_known:
+                return
+            first_ym = min(first_ym, self._expiry_base)
+            last_ym = max(last_ym, last_known)
+        if self.calendar is None:
+            self.calendar = TradeCalendar.from_local_data()
+        months = np.arange(first_ym, last_ym + 1) - 1970 * 12
+        first_days = months.astype('datetime64[M]').astype('datetime64[D]')
+        # 1970-01-01为周四，weekday按周一为0计算
+        weekday = (first_days.astype('int64') + 3) % 7
+        third_fridays = first_days + ((4 - weekday) % 7 + 14)
+        trading = self.calendar.trading_days_array(third_fridays[0], third_fridays[-1] + np.timedelta64(31, 'D'))
+        self._expiry = trading[np.searchsorted(trading, third_fridays)]
+        self._expiry_base = first_ym
+
+    @staticmethod
+    def _parse_dates(values):
+        """
+        Parse distinct date values to datetime64[D], unparseable values become NaT
+        'YYYYMMDD'字符串或整数按该格式解析，Timestamp、datetime64、'YYYY-MM-DD'等由pd.to_datetime识别
+        """
+        values = pd.Series(values, dtype=object)
+        # 与NaN混在一起的整数日期会变成浮点数，如20240110.0
+        as_str = values.astype(str).str.replace(r'\.0$', '', regex=True)
+        compact = as_str.str.fullmatch(r'\d{8}').to_numpy()
+        days = pd.to_datetime(as_str[compact], format='%Y%m%d', errors='coerce')
+        others = pd.to_datetime(values[~compact], format='mixed', errors='coerce', utc=True).dt.tz_localize(None)
+        result = np.full(len(values), np.datetime64('NaT', 'D'))
+        result[compact] = days.to_numpy().astype('datetime64[D]')
+        result[~compact] = others.to_numpy().astype('datetime64[D]')
+        return result
+
+    def is_main_contract_array(self, dates, contract_codes):
+        """
+        Vectorized is_main_contract for whole columns of (date, 合约代码) pairs
+        当月合约在到期日之前为主连，下月合约自到期日起为主连；
+        日期可为'YYYYMMDD'字符串或整数、Timestamp、datetime64等，日期或合约代码无法解析时为False
+        :param dates: 日期序列
+        :param contract_codes: 合约代码序列，与dates等长
+        :return: bool数组
+        """
+        # 日期和合约代码重复度很高，只对去重后的取值做解析
+        dates = np.asarray(dates)
+        if dates.dtype.kind == 'M':
+            # 经ParquetSink读回的date32日期为datetime64
+            days = dates.astype('datetime64[D]')
+        else:
+            date_codes, date_uniques = pd.factorize(dates.astype(object))
+            days = self._parse_dates(date_uniques)
+            # 空值的编码为-1，取到末尾追加的无效值
+            days = np.append(days, np.datetime64('NaT', 'D'))[date_codes]
+
+        code_codes, code_uniques = pd.factorize(np.asarray(contract_codes, dtype=object))
+        code_years, code_months = [], []
+        for code in code_uniques:
+            try:
+                code_years.append(int('20' + code[-4:-2]))
+                code_months.append(int(code[-2:]))
+            except Exception:
+                code_years.append(-1)
+                code_months.append(-1)
+        code_years = np.array(code_years + [-1])[code_codes]
+        code_months = np.array(code_months + [-1])[code_codes]
+
+        valid = ~np.isnat(days) & (code_years >= 0)
+        result = np.zeros(len(days), dtype=bool)
+        if not valid.any():
+            return result
+        days, code_years, code_months = days[valid], code_years[valid], code_months[valid]
+        ym = days.astype('datetime64[M]').astype('int64') + 1970 * 12
+        self._expiry_table(int(ym.min()), int(ym.max()))
+        expiry = self._expiry[ym - self._expiry_base]
+        year, month = ym // 12, ym % 12 + 1
+        current = (code_years == year) & (code_months == month)
+        # 下月按月序号加1计算，12月到期后由次年1月合约接替
+        nxt = ym + 1
+        following = (code_years == nxt // 12) & (code_months == nxt % 12 + 1)
+        result[valid] = (current & (days < expiry)) | (following & (days >= expiry))
+        return result
+
     def is_main_contract(self, date_str, contract_code):
         """Determine if it's a main contract"""
-        try:
-            date = datetime.datetime.strptime(str(date_str), '%Y%m%d')
-            year = date.year
-            month = date.month
-
-            code_year = int('20' + contract_code[-4:-2])
-            code_month = int(contract_code[-2:])
-
-            c = calendar.Calendar()
-            month_days = [d for d in c.itermonthdates(year, month) if d.month == month]
-            thursdays = [d for d in month_days if d.weekday() == 3]
-            fridays = [d for d in month_days if d.weekday() == 4]
-            third_thursday = thursdays[2]
-            third_friday = fridays[2]
-
-            if code_year == year and code_month == month:
-                return date.date() <= third_thursday
-            elif code_year == year and code_month == (month % 12 + 1):
-                return date.date() >= third_friday
-            return False
-        except Exception:
-            return False
+        return bool(self.is_main_contract_array([date_str], [contract_code])[0])
+
+    def _clean_company_names(self, names):
+        """Clean a column of company names, once per distinct value"""
+        codes, uniques = pd.factorize(names)
+        # NaN的编码为-1，正好取到末尾追加的''
+        cleaned = np.array([self._clean_company_name(x) for x in uniques] + [''], dtype=object)
+        return cleaned[codes]
+
+    def _to_long(self, df):
+        """
+        Reshape the three (成交量/买单/卖单) blocks into one long frame in a single pass
+        :return: DataFrame with one row per (source row, dimension), '_row' is the source row position,
+                 '_dim' is the dimension position in RANK_DIMENSIONS, '_named' marks non-NaN member names
+        """
+        n = len(df)
+        parts = []
+        for i, (dim, name_col, value_col, change_col) in enumerate(RANK_DIMENSIONS):
+            id_col = name_col.replace('会员简称', '会员ID')
+            if name_col not in df.columns and id_col in df.columns:
+                # 会员ID列：名称已在字典中规范化，同一会员的曾用名解码为同一标准名称
+                if self.members is None:
+                    raise ValueError(f"数据含{id_col}列，需要传入members（MemberDictionary）")
+                ids = df[id_col].to_numpy()
+                named = ids >= 0
+                names = self.members.decode(ids)
+                names[~named] = ''
+            else:
+                named = df[name_col].notna().to_numpy()
+                names = self._clean_company_names(df[name_col])
+            parts.append(pd.DataFrame({
+                '_row': np.arange(n),
+                '_dim': np.full(n, i),
+                '_named': named,
+                '公司简称': names,
+                '数值': df[value_col].to_numpy(),
+                '比上一交易日增减': df[change_col].to_numpy(),
+            }))
+        long_df = pd.concat(parts, ignore_index=True)
+        long_df['比上一交易日增减比例'] = self._calc_change_rate_array(
+            long_df['数值'].to_numpy(dtype=float), long_df['比上一交易日增减'].to_numpy(dtype=float)
+        )
+        return long_df
 
     def process_by_company(self, df):
-        """Process data by company and return structured DataFrame"""
+        """
+        Process data by company and return structured DataFrame
+        Rows are ordered by company, then source row, then dimension (成交量/持买单量/持卖单量)
+        """
         df = self._clean_data(df)  # 清理数据
-        
-        company_set = set(
-            self._clean_company_name(x) for x in 
-            df['成交量-会员简称'].tolist() +
-            df['买单-会员简称'].tolist() +
-            df['卖单-会员简称'].tolist()
-            if pd.notna(x)
-        )
+        long_df = self._to_long(df)
 
-        result_dfs = []
-        for company in company_set:
-            company_data = []
-            for _, row in df.iterrows():
-                c1 = self._clean_company_name(row['成交量-会员简称'])
-                c2 = self._clean_company_name(row['买单-会员简称'])
-                c3 = self._clean_company_name(row['卖单-会员简称'])
-                
-                if company in (c1, c2, c3):
-                    base_data = {
-                        'date': row['date'],
-                        '合约代码': row['合约代码'],
-                        '公司简称': company,
-                        '合约类型': row['合约类型'],
-                        '是否主连合约': self.is_main_contract(row['date'], row['合约代码'])
-                    }
-                    
-                    # Process each dimension separately
-                    if c1 == company:
-                        vol_data = base_data.copy()
-                        vol_data.update({
-                            '统计维度': '成交量',
-                            '排名': row['排名'],
-                            '数值': row['成交量-成交量'],
-                            '比上一交易日增减': row['成交量-比上一交易日增减'],
-                            '比上一交易日增减比例': self._calc_change_rate(
-                                row['成交量-成交量'], 
-                                row['成交量-比上一交易日增减']
-                            )
-                        })
-                        company_data.append(vol_data)
-                        
-                    if c2 == company:
-                        buy_data = base_data.copy()
-                        buy_data.update({
-                            '统计维度': '持买单量',
-                            '排名': row['排名'],
-                            '数值': row['买单-持买单量'],
-                            '比上一交易日增减': row['买单-比上一交易日增减'],
-                            '比上一交易日增减比例': self._calc_change_rate(
-                                row['买单-持买单量'], 
-                                row['买单-比上一交易日增减']
-                            )
-                        })
-                        company_data.append(buy_data)
-                        
-                    if c3 == company:
-                        sell_data = base_data.copy()
-                        sell_data.update({
-                            '统计维度': '持卖单量',
-                            '排名': row['排名'],
-                            '数值': row['卖单-持卖单量'],
-                            '比上一交易日增减': row['卖单-比上一交易日增减'],
-                            '比上一交易日增减比例': self._calc_change_rate(
-                                row['卖单-持卖单量'], 
-                                row['卖单-比上一交易日增减']
-                            )
-                        })
-                        company_data.append(sell_data)
-            
-            if company_data:
-                result_dfs.append(pd.DataFrame(company_data))
-        
-        return pd.concat(result_dfs, ignore_index=True) if result_dfs else pd.DataFrame()
+        # 公司集合只包含非空的会员简称，空值清理后为''，仅当存在清理后为''的会员简称时才会被保留
+        company_set = long_df.loc[long_df['_named'], '公司简称'].unique()
+        long_df = long_df[long_df['公司简称'].isin(company_set)]
+        if long_df.empty:
+            return pd.DataFrame()
+        long_df = long_df.sort_values(['公司简称', '_row', '_dim'], kind='stable')
+
+        rows = long_df['_row'].to_numpy()
+        dates = df['date'].to_numpy()[rows]
+        contracts = df['合约代码'].to_numpy()[rows]
+        dim_names = np.array([dim for dim, _, _, _ in RANK_DIMENSIONS], dtype=object)
+        return pd.DataFrame({
+            'date': dates,
+            '合约代码': contracts,
+            '公司简称': long_df['公司简称'].to_numpy(),
+            '合约类型': df['合约类型'].to_numpy()[rows],
+            '是否主连合约': self.is_main_contract_array(dates, contracts),
+            '统计维度': dim_names[long_df['_dim'].to_numpy()],
+            '排名': df['排名'].to_numpy()[rows],
+            '数值': long_df['数值'].to_numpy(),
+            '比上一交易日增减': long_df['比上一交易日增减'].to_numpy(),
+            '比上一交易日增减比例': long_df['比上一交易日增减比例'].to_numpy(),
+        })
 
     def process_original_format(self, df):
-        """Process data in original format with all dimensions combined"""
+        """
+        Process data in original format with all dimensions combined
+        One row per (date, 合约代码, 合约类型, company), ordered by group then company;
+        dimensions the company does not appear in are NaN, so numeric columns stay numeric
+        """
         df = self._clean_data(df)  # 清理数据
-        result_rows = []
-        grouped = df.groupby(['date', '合约代码', '合约类型'])
-        
-        for (date, contract, contract_type), group in grouped:
-            # Get all unique companies in this group
-            companies = set(
-                self._clean_company_name(x) for x in 
-                group['成交量-会员简称'].tolist() +
-                group['买单-会员简称'].tolist() +
-                group['卖单-会员简称'].tolist()
-                if pd.notna(x)
-            )
-            
-            for company in companies:
-                row_data = {
-                    'date': date,
-                    '合约代码': contract,
-                    '公司简称': company,
-                    '合约类型': contract_type,
-                    '是否主连合约': self.is_main_contract(date, contract),
-                    '成交量排名': '',
-                    '买单排名': '',
-                    '卖单排名': '',
-                    '成交量': '',
-                    '成交量-比上一交易日增减': '',
-                    '成交量-比上一交易日增减比例': '',
-                    '买单-持买单量': '',
-                    '买单-比上一交易日增减': '',
-                    '买单-比上一交易日增减比例': '',
-                    '卖单-持卖单量': '',
-                    '卖单-比上一交易日增减': '',
-                    '卖单-比上一交易日增减比例': ''
-                }
-                
-                # Fill data for each dimension
-                for _, record in group.iterrows():
-                    if self._clean_company_name(record['成交量-会员简称']) == company:
-                        row_data.update({
-                            '成交量排名': record['排名'],
-                            '成交量': record['成交量-成交量'],
-                            '成交量-比上一交易日增减': record['成交量-比上一交易日增减'],
-                            '成交量-比上一交易日增减比例': self._calc_change_rate(
-                                record['成交量-成交量'],
-                                record['成交量-比上一交易日增减']
-                            )
-                        })
-                        
-                    if self._clean_company_name(record['买单-会员简称']) == company:
-                        row_data.update({
-                            '买单排名': record['排名'],
-                            '买单-持买单量': record['买单-持买单量'],
-                            '买单-比上一交易日增减': record['买单-比上一交易日增减'],
-                            '买单-比上一交易日增减比例': self._calc_change_rate(
-                                record['买单-持买单量'],
-                                record['买单-比上一交易日增减']
-                            )
-                        })
-                        
-                    if self._clean_company_name(record['卖单-会员简称']) == company:
-                        row_data.update({
-                            '卖单排名': record['排名'],
-                            '卖单-持卖单量': record['卖单-持卖单量'],
-                            '卖单-比上一交易日增减': record['卖单-比上一交易日增减'],
-                            '卖单-比上一交易日增减比例': self._calc_change_rate(
-                                record['卖单-持卖单量'],
-                                record['卖单-比上一交易日增减']
-                            )
-                        })
-                
-                result_rows.append(row_data)
-        
-        return pd.DataFrame(result_rows)
+        group_ids = df.groupby(['date', '合约代码', '合约类型'], sort=True).ngroup().to_numpy()
+        long_df = self._to_long(df)
+        # 分组键含空值的行不参与分组
+        long_df['_gid'] = group_ids[long_df['_row'].to_numpy()]
+        long_df = long_df[pd.notna(long_df['_gid'])]
+        company_codes, companies = pd.factorize(long_df['公司简称'])
+        long_df['_key'] = long_df['_gid'].astype('int64') * len(companies) + company_codes
+
+        # 每组的公司集合只包含组内非空的会员简称
+        keys = long_df[long_df['_named'].to_numpy()].drop_duplicates('_key')
+        if keys.empty:
+            return pd.DataFrame()
+        keys = keys.sort_values(['_gid', '公司简称'], kind='stable')
+        key_index = pd.Index(keys['_key'])
+        rows = keys['_row'].to_numpy()
+        dates = df['date'].to_numpy()[rows]
+        contracts = df['合约代码'].to_numpy()[rows]
+        result = pd.DataFrame({
+            'date': dates,
+            '合约代码': contracts,
+            '公司简称': keys['公司简称'].to_numpy(),
+            '合约类型': df['合约类型'].to_numpy()[rows],
+            '是否主连合约': self.is_main_contract_array(dates, contracts),
+        })
+
+        # 同一公司在组内同一维度出现多次时，以最后一行为准
+        long_df = long_df[long_df['_key'].isin(key_index)]
+        long_df = long_df.drop_duplicates(['_key', '_dim'], keep='last')
+        ranks = df['排名'].to_numpy()
+        blocks = {}
+        for i, dim_columns in enumerate(ORIGINAL_FORMAT_COLUMNS):
+            rank_col, value_col, change_col, rate_col = dim_columns
+            part = long_df[long_df['_dim'].to_numpy() == i].set_index('_key').reindex(key_index)
+            row_pos = part['_row'].to_numpy()
+            found = pd.notna(row_pos)
+            rank = np.full(len(part), np.nan)
+            rank[found] = ranks[row_pos[found].astype('int64')]
+            blocks[rank_col] = rank
+            blocks[value_col] = part['数值'].to_numpy()
+            blocks[change_col] = part['比上一交易日增减'].to_numpy()
+            blocks[rate_col] = part['比上一交易日增减比例'].to_numpy()
+        # 与原格式一致：先三个排名列，再依次为成交量、买单、卖单的数值、增减、增减比例
+        for col in [c[0] for c in ORIGINAL_FORMAT_COLUMNS] + [c for cols in ORIGINAL_FORMAT_COLUMNS for c in cols[1:]]:
+            result[col] = blocks[col]
+        return result
 
     def _calc_change_rate(self, current, change):
         """Calculate change rate"""
@@ -212,6 +273,12 @@ class FoDataProcessor:
         except (ValueError, TypeError):
             return None
 
+    def _calc_change_rate_array(self, current, change):
+        """Vectorized _calc_change_rate, NaN where the previous value is 0"""
+        prev = current - change
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(prev != 0, change / prev, np.nan)
+
 # 使用示例
 # processor = FoDataProcessor()
 # processed_by_company = processor.process_by_company(df)
@@ -1,13 +1,130 @@
 import os
-import requests
 import zipfile
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 from tqdm import tqdm
-from io import StringIO
+from io import StringIO, BytesIO
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
 import warnings
+from .fetchEngine import HostRateLimiter, run_ordered
+from .tradeCalendar import TradeCalendar
+from .httpCache import HttpCache, DEFAULT_CACHE_DIR
+from .httpTransport import HttpTransport
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
 
+
+def _cffex_csv_date(csv_file):
+    """中金所期权历史行情zip内文件的日期，取自文件名，如'20240603_1.csv'，无法解析时为NaT"""
+    return pd.to_datetime(os.path.basename(csv_file).split('_')[0], errors='coerce')
+
+
+def _in_range(date, start, end):
+    return not pd.isna(date) and start <= date <= end
+
+
+def _parse_cffex_csv(csv_file, raw, symbol, start, end):
+    """
+    解析中金所期权历史行情zip中的单个csv，并在文件级别完成symbol和日期过滤
+    定义在模块级别，便于在子进程中执行
+    :param csv_file: zip内的文件名，如'20240603_1.csv'
+    :param raw: 文件内容bytes
+    :return: DataFrame，无数据或读取失败时返回None
+    """
+    # 日期取自文件名，不在范围内的文件无需解析
+    date = _cffex_csv_date(csv_file)
+    if not _in_range(date, start, end):
+        return None
+    # 只检测一次编码，整份文件只解码、解析一次
+    text = None
+    for enc in ['utf-8', 'gbk', 'latin1']:
+        try:
+            text = raw.decode(enc)
+            break
+        except UnicodeDecodeError:
+            continue
+    try:
+        df = pd.read_csv(StringIO(text))
+    except pd.errors.EmptyDataError:
+        print(f"警告：{csv_file} 文件为空，已跳过。")
+        return None
+    except Exception:
+        print(f"警告：{csv_file} 读取失败，已跳过。")
+        return None
+    if df.empty:
+        return None
+    df['date'] = date
+    # 提取symbol字段：合约代码前2字符中的英文部分
+    if '合约代码' in df.columns:
+        df['symbol'] = df['合约代码'].astype(str).str.extract(r'^([A-Za-z]+)')
+        # 剔除合约代码为“小计”“合计”的数据
+        df = df[~df['合约代码'].astype(str).str.strip().isin(['小计', '合计'])]
+    else:
+        df['symbol'] = None
+    # 如指定symbol则只保留对应symbol的数据，否则全部保留（已剔除小计、合计）
+    if symbol:
+        df = df[df['symbol'] == symbol]
+    return df if not df.empty else None
+
+
+# 期权风险指标整理后新增的分类字段
+RISK_CATEGORY_COLUMNS = ['跟踪ETF', 'ETF代码', '多空类型']
+
+
+def _strip_str_columns(df):
+    """去除所有字符串字段的首尾空白字符"""
+    for col in df.select_dtypes(include=['object', 'string']).columns:
+        df[col] = df[col].astype(str).str.strip()
+    return df
+
+
+def _normalize_risk_frame(df, code_col=None):
+    """
+    期权风险指标的统一整理，在每个交易日的数据到达时执行：
+    去除字符串首尾空白，并新增分类类型的"跟踪ETF"、"ETF代码"、"多空类型"三列
+    :param df: 单日风险指标DataFrame
+    :param code_col: 用于截取ETF代码（前六位）的字段，None或字段不存在时ETF代码为空
+    :return: 整理后的DataFrame
+    """
+    df = _strip_str_columns(df)
+    if '合约简称' in df.columns:
+        name = df['合约简称'].astype(str)
+        # 跟踪ETF：合约简称中第一个"购"字之前的部分，没有"购"时取"沽"字之前的部分
+        etf_name = name.str.extract(r'^([^购]*)购', expand=False)
+        etf_name = etf_name.fillna(name.str.extract(r'^([^沽]*)沽', expand=False)).fillna('')
+        long_short = np.select(
+            [name.str.contains('购|多', na=False), name.str.contains('沽|空', na=False)],
+            ['购', '沽'], default=''
+        )
+    else:
+        etf_name = ''
+        long_short = ''
+    if code_col is not None and code_col in df.columns:
+        etf_code = df[code_col].astype(str).str[:6]
+    else:
+        etf_code = ''
+    df['跟踪ETF'] = etf_name
+    df['ETF代码'] = etf_code
+    df['多空类型'] = long_short
+    for col in RISK_CATEGORY_COLUMNS:
+        df[col] = df[col].astype('category')
+    return df
+
+
+def _concat_categorical(dfs, category_cols):
+    """
+    合并各日数据，分类字段先统一类别再合并，结果仍为category类型
+    :param dfs: DataFrame列表
+    :param category_cols: 各DataFrame中均为category类型的字段
+    """
+    for col in category_cols:
+        categories = union_categoricals([df[col] for df in dfs]).categories
+        for df in dfs:
+            df[col] = df[col].cat.set_categories(categories)
+    return pd.concat(dfs, ignore_index=True)
+
+
 class foDataFetcher:
     """
     用于获取中金所期货、期权持仓，以及上交所/深交所的期权排名数据和期权历史行情数据
@@ -15,18 +132,103 @@ class foDataFetcher:
     FUTURE_SYMBOLS = ['IF', 'IC', 'IM', 'IH','TS','TF','T','TL']
     OPTION_SYMBOLS = ['IO', 'MO', 'HO']
 
-    def __init__(self):
+    def __init__(self, max_workers=4, rate_limits=None, default_rate=5.0, calendar=None,
+                 cache_dir=DEFAULT_CACHE_DIR, cache_ttl=6 * 3600, cache_max_bytes=2 * 1024 ** 3,
+                 max_retries=3):
+        """
+        :param max_workers: 按日下载时的最大并发数，1为顺序下载
+        :param rate_limits: dict，{域名: 每秒请求数}，单独设置某个交易所的限速
+        :param default_rate: 未单独设置的域名每秒请求数，默认5次（相当于原先每次请求后sleep 0.2秒）
+        :param calendar: TradeCalendar，用于枚举交易日，默认由仓库中的本地行情数据构建
+        :param cache_dir: 下载缓存目录，None则不使用缓存
+        :param cache_ttl: 当天及空响应的缓存有效期（秒），历史交易日的数据永久缓存
+        :param cache_max_bytes: 缓存容量上限（字节），超出后按LRU淘汰
+        :param max_retries: 遇到5xx、超时、连接错误时的最大重试次数
+        """
         self.base_url = "http://www.cffex.com.cn/sj/ccpm/{ym}/{day}/{symbol}_1.csv"
         self.option_zip_url = "http://www.cffex.com.cn/sj/historysj/{ym}/zip/{ym}.zip"
+        self.max_workers = max_workers
+        # 各交易所域名分别限速，上交所、深交所、中金所的下载可以同时进行
+        self.rate_limiter = HostRateLimiter(default_rate=default_rate, rates=rate_limits)
+        # 只请求交易日，跳过周末和节假日
+        self.calendar = calendar if calendar is not None else TradeCalendar.from_local_data()
+        self.cache = HttpCache(cache_dir, max_bytes=cache_max_bytes) if cache_dir else None
+        self.cache_ttl = cache_ttl
+        # 所有请求经由同一个传输层：按域名复用连接池，失败自动退避重试
+        self.transport = HttpTransport(pool_size=max_workers, max_retries=max_retries,
+                                       rate_limiter=self.rate_limiter)
+        # 最近一次调用中重试后仍下载失败的日期，批量接口中为(日期, 品种)
+        self.failed_dates = []
+
+    def _get_content(self, url, headers=None, timeout=10, trade_date=None, min_size=0, check_cache=True):
+        """
+        GET请求，优先读取本地缓存
+        :param trade_date: 数据所属日期，早于今天的非空响应永久缓存，其余按cache_ttl过期
+        :param min_size: 响应小于该字节数视为空数据
+        :param check_cache: 是否先查缓存，调用方已查过缓存时传False
+        :return: bytes，状态码非200时返回None
+        """
+        if self.cache is not None and check_cache:
+            content = self.cache.get(url)
+            if content is not None:
+                return content
+        resp = self.transport.get(url, headers=headers, timeout=timeout)
+        if resp.status_code != 200:
+            return None
+        if self.cache is not None:
+            ttl = self.cache_ttl
+            if trade_date is not None and len(resp.content) >= min_size \
+                    and pd.Timestamp(trade_date).date() < datetime.today().date():
+                ttl = None
+            self.cache.put(url, resp.content, ttl=ttl)
+        return resp.content
+
+    def _run_daily(self, day_func, date_list, desc=None, label=''):
+        """
+        并发执行按日下载任务，结果按date_list顺序返回，剔除无数据的日期
+        下载或解析失败的日期记录在self.failed_dates中并汇总打印，不会被静默丢弃
+        :param date_list: 日期列表，批量任务中为(日期, 品种)列表
+        """
+        failed = []
 
-    def get_cffex_position_rank(self, symbol, start_date=None, end_date=None):
+        def task(item):
+            try:
+                return day_func(item)
+            except Exception as e:
+                # 批量任务的item为(日期, 品种)
+                item_desc = ' '.join(item) if isinstance(item, tuple) else item
+                print(f"{item_desc} {label}下载或解析失败: {e}")
+                failed.append(item)
+                return None
+
+        results = run_ordered(task, date_list, max_workers=self.max_workers, desc=desc)
+        self.failed_dates = sorted(failed)
+        if failed:
+            print(f"警告：以下{len(failed)}个日期下载失败，数据不完整：{self.failed_dates}")
+        return [df for df in results if df is not None]
+
+    def get_cffex_position_rank(self, symbol, start_date=None, end_date=None, members=None):
         """
         获取中金所期货或期权持仓排名数据
         :param symbol: 品种名称，如'IF', 'IC', 'IM', 'IH', 'TS','TF','T','TL', 'IO', 'MO', 'HO'
         :param start_date: 'YYYYMMDD'字符串，默认最近30天
         :param end_date: 'YYYYMMDD'字符串，默认最近30天
+        :param members: MemberDictionary，传入时会员简称列替换为int16会员ID列
         :return: DataFrame，date和合约类型为普通列
         """
+        return self.get_cffex_position_rank_batch([symbol], start_date=start_date, end_date=end_date,
+                                                  members=members)
+
+    def get_cffex_position_rank_batch(self, symbols, start_date=None, end_date=None, members=None):
+        """
+        批量获取多个品种的中金所持仓排名数据，所有(日期, 品种)作为一批任务统一调度下载
+        :param symbols: 品种名称列表，如foDataFetcher.FUTURE_SYMBOLS + foDataFetcher.OPTION_SYMBOLS
+        :param start_date: 'YYYYMMDD'字符串，默认最近30天
+        :param end_date: 'YYYYMMDD'字符串，默认最近30天
+        :param members: MemberDictionary，传入时'成交量-会员简称'等三列替换为同位置的
+                        '成交量-会员ID'等int16列，名称规范化由字典完成
+        :return: DataFrame，按日期、再按symbols顺序排列，用'合约类型'列区分品种
+        """
         # 日期处理
         if end_date is None:
             end = datetime.today()
@@ -37,39 +239,11 @@ class foDataFetcher:
         else:
             start = datetime.strptime(start_date, "%Y%m%d")
 
-        date_list = []
-        cur = start
-        while cur <= end:
-            date_list.append(cur.strftime("%Y%m%d"))
-            cur += timedelta(days=1)
+        # 生成交易日列表
+        date_list = self.calendar.trading_days(start, end, fmt="%Y%m%d")
+        tasks = [(date_str, symbol) for date_str in date_list for symbol in symbols]
 
-        all_dfs = []
-        for date_str in date_list:
-            ym = date_str[:6]
-            day = date_str[6:8]
-            url = self.base_url.format(ym=ym, day=day, symbol=symbol)
-            try:
-                resp = requests.get(url, timeout=10)
-                if resp.status_code != 200 or len(resp.content) < 10:
-                    continue
-                # 用GBK解码，防止中文乱码
-                lines = resp.content.decode('gbk', errors='ignore').splitlines()
-                if len(lines) < 2:
-                    continue
-                data_lines = lines[2:]
-                columns = [
-                    'date', '合约代码', '排名',
-                    '成交量-会员简称', '成交量-成交量', '成交量-比上一交易日增减',
-                    '买单-会员简称', '买单-持买单量', '买单-比上一交易日增减',
-                    '卖单-会员简称', '卖单-持卖单量', '卖单-比上一交易日增减'
-                ]
-                csv_text = ','.join(columns) + '\n' + '\n'.join(data_lines)
-                df = pd.read_csv(StringIO(csv_text))
-                df['date'] = date_str
-                df['合约类型'] = symbol  # 新增品种类型列
-                all_dfs.append(df)
-            except Exception as e:
-                print(f"{date_str} {symbol} 下载或解析失败: {e}")
+        all_dfs = self._run_daily(lambda task: self._fetch_rank_day(task[1], task[0]), tasks)
 
         if all_dfs:
             result = pd.concat(all_dfs, ignore_index=True)
@@ -83,32 +257,78 @@ class foDataFetcher:
             result['排名'] = result['排名_num'].astype(int)
             result = result.drop(columns=['排名_num'])
             
+            if members is not None:
+                # 会员简称编码为会员ID，规范化（删除括号及内容、空白）只对去重后的名称做一次
+                for col in ['成交量-会员简称', '买单-会员简称', '卖单-会员简称']:
+                    if col in result.columns:
+                        ids = members.encode(result[col])
+                        loc = result.columns.get_loc(col)
+                        result = result.drop(columns=[col])
+                        result.insert(loc, col.replace('会员简称', '会员ID'), ids)
+                return result
+
             # 处理会员简称列，删除括号和括号内的内容
+            # 会员简称大量重复，只对去重后的取值做正则替换，再按编码映射回各行
             for col in ['成交量-会员简称', '买单-会员简称', '卖单-会员简称']:
                 if col in result.columns:
+                    codes, names = pd.factorize(result[col].astype(str), use_na_sentinel=False)
+                    names = pd.Index(names)
                     # 删除半角括号和内容
-                    result[col] = result[col].astype(str).str.replace(r'\([^)]*\)', '', regex=True)
+                    names = names.str.replace(r'\([^)]*\)', '', regex=True)
                     # 删除全角括号和内容
-                    result[col] = result[col].str.replace(r'（[^）]*）', '', regex=True)
+                    names = names.str.replace(r'（[^）]*）', '', regex=True)
                     # 去除可能残留的空格
-                    result[col] = result[col].str.strip()
+                    names = names.str.strip()
+                    result[col] = names.take(codes).values
             return result
         else:
             print("未获取到任何数据")
-            return pd.DataFrame(columns=[
+            columns = [
                 'date', '合约类型', '合约代码', '排名',
                 '成交量-会员简称', '成交量-成交量', '成交量-比上一交易日增减',
                 '买单-会员简称', '买单-持买单量', '买单-比上一交易日增减',
                 '卖单-会员简称', '卖单-持卖单量', '卖单-比上一交易日增减'
-            ])
-
-    def get_cffex_trade_data(self, symbol=None, start_date=None, end_date=None):
+            ]
+            if members is not None:
+                columns = [c.replace('会员简称', '会员ID') for c in columns]
+            return pd.DataFrame(columns=columns)
+
+    def _fetch_rank_day(self, symbol, date_str):
+        """下载并解析单日持仓排名数据，无数据时返回None"""
+        ym = date_str[:6]
+        day = date_str[6:8]
+        url = self.base_url.format(ym=ym, day=day, symbol=symbol)
+        content = self._get_content(url, timeout=10, trade_date=date_str, min_size=10)
+        if content is None or len(content) < 10:
+            return None
+        # 用GBK解码，防止中文乱码
+        lines = content.decode('gbk', errors='ignore').splitlines()
+        if len(lines) < 2:
+            return None
+        data_lines = lines[2:]
+        columns = [
+            'date', '合约代码', '排名',
+            '成交量-会员简称', '成交量-成交量', '成交量-比上一交易日增减',
+            '买单-会员简称', '买单-持买单量', '买单-比上一交易日增减',
+            '卖单-会员简称', '卖单-持卖单量', '卖单-比上一交易日增减'
+        ]
+        csv_text = ','.join(columns) + '\n' + '\n'.join(data_lines)
+        df = pd.read_csv(StringIO(csv_text))
+        df['date'] = date_str
+        df['合约类型'] = symbol  # 新增品种类型列
+        return df
+
+    def get_cffex_trade_data(self, symbol=None, start_date=None, end_date=None, parse_workers=1):
         """
         下载中金所期权历史行情zip文件并提取所有csv数据，合并为一个DataFrame
+        zip在内存中逐月处理，每个csv只解析一次并先按symbol和日期过滤，内存占用只与所需品种的数据量相关
         :param symbol: 品种名称，如'IO', 'MO', 'HO'，默认为'IO'
         【IO】:沪深300股指期权,【HO】:上证50股指期权,【MO】:中证1000股指期权。
         :param start_date: 'YYYYMMDD'字符串，默认最近30天
         :param end_date: 'YYYYMMDD'字符串，默认最近30天
+        :param parse_workers: 解析csv的进程数，默认1即在当前进程中解析；大于1时使用进程池，
+                              在spawn启动方式下（macOS、Windows），调用脚本须把入口代码放在
+                              if __name__ == '__main__': 之下，否则子进程启动失败
         :return: 合并后的DataFrame
         """
         # 日期处理
@@ -136,83 +356,67 @@ class foDataFetcher:
                 m = 1
                 y += 1
 
-        # 下载zip文件到临时目录
-        import tempfile
-        save_dir = tempfile.mkdtemp(prefix='cffex_op_zip_')
+        executor = ProcessPoolExecutor(max_workers=parse_workers) if parse_workers > 1 else None
+        start_ts, end_ts = pd.Timestamp(start), pd.Timestamp(end)
 
+        def parse_month(content):
+            """提交一个月zip中日期在范围内的csv，返回待取结果的列表"""
+            jobs = []
+            with zipfile.ZipFile(BytesIO(content), 'r') as zf:
+                for csv_file in zf.namelist():
+                    # 先按文件名中的日期过滤，范围外的文件不解压，也不传给子进程
+                    if csv_file.endswith('.csv') and _in_range(_cffex_csv_date(csv_file), start_ts, end_ts):
+                        args = (csv_file, zf.read(csv_file), symbol, start_ts, end_ts)
+                        jobs.append(executor.submit(_parse_cffex_csv, *args) if executor else _parse_cffex_csv(*args))
+            return jobs
+
+        def collect(jobs):
+            for job in jobs:
+                df = job.result() if executor else job
+                if df is not None:
+                    all_dfs.append(df)
+
+        # 逐月下载（已下载过的月份直接读取本地缓存）并解析：
+        # 使用进程池时，下载下一个月的同时子进程解析上一个月，内存中最多保留两个月的原始数据
+        all_dfs = []
+        pending = []
         fail_list = []
-        for ym in tqdm(ym_list, desc="下载中金所期权历史行情"):
-            url = self.option_zip_url.format(ym=ym)
-            local_path = os.path.join(save_dir, f"{ym}.zip")
-            if os.path.exists(local_path):
-                tqdm.write(f"{ym} 已存在，跳过。")
-                continue
-            success = False
-            for attempt in range(3):
-                try:
-                    tqdm.write(f"正在下载月份：{ym}，尝试{attempt+1}/3")
-                    resp = requests.get(url, timeout=30)
-                    if resp.status_code == 200:
-                        with open(local_path, 'wb') as f:
-                            f.write(resp.content)
-                        success = True
-                        break
-                    else:
-                        tqdm.write(f"{ym} 下载失败，状态码：{resp.status_code}")
-                except Exception as e:
-                    tqdm.write(f"{ym} 下载异常：{e}")
-            if not success:
-                fail_list.append(ym)
+        try:
+            for ym in tqdm(ym_list, desc="下载并解析中金所期权历史行情"):
+                url = self.option_zip_url.format(ym=ym)
+                # 已结束月份的zip永久缓存，当月的zip按cache_ttl过期
+                month_end = (pd.Timestamp(f"{ym}01") + pd.offsets.MonthEnd(0)).strftime("%Y%m%d")
+                content = self.cache.get(url) if self.cache is not None else None
+                if content is not None:
+                    tqdm.write(f"{ym} 已存在，跳过下载。")
+                else:
+                    try:
+                        tqdm.write(f"正在下载月份：{ym}")
+                        # 5xx、超时、连接错误由传输层退避重试
+                        content = self._get_content(url, timeout=30, trade_date=month_end, check_cache=False)
+                    except Exception as e:
+                        tqdm.write(f"{ym} 下载异常：{e}")
+                        content = None
+                if content is None:
+                    tqdm.write(f"{ym} 下载失败")
+                    fail_list.append(ym)
+                    continue
+                jobs = parse_month(content)
+                del content
+                collect(pending)
+                pending = jobs
+            collect(pending)
+        finally:
+            if executor is not None:
+                executor.shutdown()
         tqdm.write("全部下载完成。")
+        if fail_list:
+            print(f"警告：以下月份下载失败，数据不完整：{fail_list}")
 
-        # 解压并读取所有csv
-        all_zips = [f for f in os.listdir(save_dir) if f.endswith('.zip')]
-        all_dfs = []
-        for zip_name in tqdm(all_zips, desc="解压并读取csv"):
-            zip_path = os.path.join(save_dir, zip_name)
-            with zipfile.ZipFile(zip_path, 'r') as zf:
-                for csv_file in zf.namelist():
-                    if csv_file.endswith('.csv'):
-                        with zf.open(csv_file) as f:
-                            df = None
-                            for enc in ['utf-8', 'gbk', 'latin1']:
-                                try:
-                                    df = pd.read_csv(f, encoding=enc)
-                                    break
-                                except pd.errors.EmptyDataError:
-                                    print(f"警告：{csv_file} 文件为空，已跳过。")
-                                    df = None
-                                    break
-                                except Exception:
-                                    f.seek(0)
-                                    continue
-                            if df is not None and not df.empty:
-                                base_name = os.path.basename(csv_file)
-                                date_part = base_name.split('_')[0]
-                                df['date'] = date_part
-                                # 提取symbol字段：合约代码前2字符中的英文部分
-                                if '合约代码' in df.columns:
-                                    df['symbol'] = df['合约代码'].astype(str).str.extract(r'^([A-Za-z]+)')
-                                else:
-                                    df['symbol'] = None
-                                all_dfs.append(df)
-                            elif df is None:
-                                print(f"警告：{csv_file} 读取失败，已跳过。")
         if not all_dfs:
             print("没有找到任何csv文件。")
             return pd.DataFrame()
-        else:
-            all_df = pd.concat(all_dfs, ignore_index=True)
-            # 剔除合约代码为“小计”“合计”的数据
-            if '合约代码' in all_df.columns:
-                all_df = all_df[~all_df['合约代码'].astype(str).str.strip().isin(['小计', '合计'])]
-            # 如指定symbol则只保留对应symbol的数据，否则全部保留（已剔除小计、合计）
-            if symbol:
-                all_df = all_df[all_df['symbol'] == symbol]
-            # 只保留日期范围内的数据
-            all_df['date'] = pd.to_datetime(all_df['date'], errors='coerce')
-            mask = (all_df['date'] >= start) & (all_df['date'] <= end)
-            return all_df.loc[mask].reset_index(drop=True)
+        return pd.concat(all_dfs, ignore_index=True)
 
     def get_sh_option_risk(self, symbol="全部", start_date=None, end_date=None):
         """
@@ -222,8 +426,6 @@ class foDataFetcher:
         :param end_date: 'YYYYMMDD'字符串，默认最近30天
         :return: 合并后的DataFrame，含"跟踪ETF"和"ETF代码"两列
         """
-        import time
-
         # 日期处理
         if end_date is None:
             end = datetime.today()
@@ -245,90 +447,42 @@ class foDataFetcher:
         }
         product_type = symbol_map.get(symbol, "%E5%85%A8%E9%83%A8")
 
-        # 生成日期列表
-        date_list = []
-        cur = start
-        while cur <= end:
-            date_list.append(cur.strftime("%Y%m%d"))
-            cur += timedelta(days=1)
+        # 生成交易日列表
+        date_list = self.calendar.trading_days(start, end, fmt="%Y%m%d")
 
-        all_dfs = []
-        for trade_date in tqdm(date_list, desc="下载ETF期权风险指标"):
-            url = f"https://query.sse.com.cn/derivative/downloadRisk.do?trade_date={trade_date}&productType={product_type}"
-            headers = {
-                "Referer": "https://www.sse.com.cn/",
-                "User-Agent": "Mozilla/5.0"
-            }
-            try:
-                resp = requests.get(url, headers=headers, timeout=10)
-                if resp.status_code != 200 or len(resp.content) < 100:
-                    continue
-                # 读取csv内容，尝试多种编码
-                df = None
-                for enc in ['utf-8', 'gb2312', 'gbk', 'latin1']:
-                    try:
-                        df = pd.read_csv(StringIO(resp.content.decode(enc, errors='ignore')), index_col=False)
-                        # 字段名标准化
-                        df.columns = [c.strip().replace('\ufeff', '') for c in df.columns]
-                        break
-                    except Exception:
-                        df = None
-                        continue
-                if df is None or df.empty:
-                    continue
-                df['date'] = trade_date
-                all_dfs.append(df)
-            except Exception as e:
-                print(f"{trade_date} {symbol} 下载或解析失败: {e}")
-            time.sleep(0.2)  # 防止被封
+        all_dfs = self._run_daily(
+            lambda trade_date: self._fetch_sh_risk_day(symbol, product_type, trade_date),
+            date_list, desc="下载ETF期权风险指标", label=f"{symbol} "
+        )
 
         if not all_dfs:
             print("未获取到任何数据")
             return pd.DataFrame()
 
-        # 合并前过滤掉没有“合约简称”列的df
-        all_dfs = [df for df in all_dfs if "合约简称" in df.columns]
-
-        if not all_dfs:
-            print("未获取到任何含“合约简称”字段的数据")
-            return pd.DataFrame()
-
-        result = pd.concat(all_dfs, ignore_index=True)
-        # 合并后，去除所有字符串字段的首尾空白字符
-        for col in result.select_dtypes(include='object').columns:
-            result[col] = result[col].astype(str).str.strip()
-   
-        # 新增“跟踪ETF”列：为'合约简称'中"购"或"沽"字符前面的部分（不含购、沽）
-        def extract_etf_name(x):
-            if pd.isna(x):
-                return ""
-            idx = x.find("购")
-            if idx == -1:
-                idx = x.find("沽")
-            if idx == -1:
-                return ""
-            return x[:idx]
-        result["跟踪ETF"] = result["合约简称"].astype(str).apply(extract_etf_name)
-       
-       # 新增“ETF代码”列：为'交易代码'前六位
-        if "交易代码" in result.columns:
-            result["ETF代码"] = result["交易代码"].astype(str).str[:6]
-        else:
-            result["ETF代码"] = ""
-
-        # 新增“多空类型”列
-        def extract_long_short(x):
-            if pd.isna(x):
-                return ""
-            if ("购" in x) or ("多" in x):
-                return "购"
-            elif ("沽" in x) or ("空" in x):
-                return "沽"
-            else:
-                return ""
-        result["多空类型"] = result["合约简称"].astype(str).apply(extract_long_short)
-
-        return result 
+        return _concat_categorical(all_dfs, RISK_CATEGORY_COLUMNS)
+
+    def _fetch_sh_risk_day(self, symbol, product_type, trade_date):
+        """下载并解析单日上交所ETF期权风险指标，无数据时返回None"""
+        url = f"https://query.sse.com.cn/derivative/downloadRisk.do?trade_date={trade_date}&productType={product_type}"
+        content = self._get_content(url, timeout=10, trade_date=trade_date, min_size=100)
+        if content is None or len(content) < 100:
+            return None
+        # 读取csv内容，尝试多种编码
+        df = None
+        for enc in ['utf-8', 'gb2312', 'gbk', 'latin1']:
+            try:
+                df = pd.read_csv(StringIO(content.decode(enc, errors='ignore')), index_col=False)
+                # 字段名标准化
+                df.columns = [c.strip().replace('\ufeff', '') for c in df.columns]
+                break
+            except Exception:
+                df = None
+                continue
+        # 没有“合约简称”字段的数据无法整理，视为无数据
+        if df is None or df.empty or '合约简称' not in df.columns:
+            return None
+        df['date'] = trade_date
+        return _normalize_risk_frame(df, code_col='交易代码')
 
     def get_sz_option_risk(self, start_date=None, end_date=None):
         """
@@ -337,8 +491,6 @@ class foDataFetcher:
         :param end_date: 'YYYYMMDD'字符串，默认最近30天
         :return: 合并后的DataFrame，含"跟踪ETF"、"ETF代码"、"多空类型"三列
         """
-        import time
-
         # 日期处理
         if end_date is None:
             end = datetime.today()
@@ -349,88 +501,49 @@ class foDataFetcher:
         else:
             start = datetime.strptime(start_date, "%Y%m%d")
 
-        # 生成日期列表
-        date_list = []
-        cur = start
-        while cur <= end:
-            date_list.append(cur.strftime("%Y-%m-%d"))
-            cur += timedelta(days=1)
+        # 生成交易日列表
+        date_list = self.calendar.trading_days(start, end, fmt="%Y-%m-%d")
 
-        all_dfs = []
-        for trade_date in tqdm(date_list, desc="下载深交所ETF期权风险指标"):
-            url = f"https://www.szse.cn/api/report/ShowReport?SHOWTYPE=xlsx&CATALOGID=option_hyfxzb&TABKEY=tab1&txtSearchDate={trade_date}"
-            headers = {
-                "Referer": "https://www.szse.cn/",
-                "User-Agent": "Mozilla/5.0"
-            }
-            try:
-                resp = requests.get(url, headers=headers, timeout=15)
-                if resp.status_code != 200 or len(resp.content) < 100:
-                    continue
-                df = None
-                for enc in ['utf-8', 'gbk', 'gb2312', 'latin1']:
-                    try:
-                        df = pd.read_excel(pd.io.common.BytesIO(resp.content), dtype=str)
-                        # 字段名标准化
-                        df.columns = [c.strip().replace('\ufeff', '') for c in df.columns]
-                        break
-                    except Exception:
-                        df = None
-                        continue
-                if df is None or df.empty:
-                    continue
-                df['date'] = trade_date
-                all_dfs.append(df)
-            except Exception as e:
-                print(f"{trade_date} 下载或解析失败: {e}")
-            time.sleep(0.2)  # 防止被封
+        url_template = "https://www.szse.cn/api/report/ShowReport?SHOWTYPE=xlsx&CATALOGID=option_hyfxzb&TABKEY=tab1&txtSearchDate={trade_date}"
+        def normalize(df):
+            # 存在'交易代码'字段时，ETF代码取'合约代码'前六位
+            code_col = '合约代码' if '交易代码' in df.columns else None
+            return _normalize_risk_frame(df, code_col=code_col)
+
+        all_dfs = self._run_daily(
+            lambda trade_date: self._fetch_szse_report_day(url_template, trade_date, normalize),
+            date_list, desc="下载深交所ETF期权风险指标"
+        )
 
         if not all_dfs:
             print("未获取到任何数据")
             return pd.DataFrame()
 
-        result = pd.concat(all_dfs, ignore_index=True)
-        # 去除所有字符串字段的首尾空白字符
-        for col in result.select_dtypes(include='object').columns:
-            result[col] = result[col].astype(str).str.strip()
-
-        # 新增“跟踪ETF”列：为'合约简称'中"购"或"沽"字符前面的部分（不含购、沽）
-        def extract_etf_name(x):
-            if pd.isna(x):
-                return ""
-            idx = x.find("购")
-            if idx == -1:
-                idx = x.find("沽")
-            if idx == -1:
-                return ""
-            return x[:idx]
-        if "合约简称" in result.columns:
-            result["跟踪ETF"] = result["合约简称"].astype(str).apply(extract_etf_name)
-        else:
-            result["跟踪ETF"] = ""
-
-        # 新增“ETF代码”列：为'交易代码'前六位
-        if "交易代码" in result.columns:
-            result["ETF代码"] = result["合约代码"].astype(str).str[:6]
-        else:
-            result["ETF代码"] = ""
-
-        # 新增“多空类型”列
-        def extract_long_short(x):
-            if pd.isna(x):
-                return ""
-            if ("购" in x) or ("多" in x):
-                return "购"
-            elif ("沽" in x) or ("空" in x):
-                return "沽"
-            else:
-                return ""
-        if "合约简称" in result.columns:
-            result["多空类型"] = result["合约简称"].astype(str).apply(extract_long_short)
-        else:
-            result["多空类型"] = ""
+        return _concat_categorical(all_dfs, RISK_CATEGORY_COLUMNS)
 
-        return result
+    def _fetch_szse_report_day(self, url_template, trade_date, normalize=_strip_str_columns):
+        """
+        下载并解析单日深交所xlsx报表，无数据时返回None
+        :param normalize: 单日数据的整理函数，默认只去除字符串首尾空白
+        """
+        url = url_template.format(trade_date=trade_date)
+        content = self._get_content(url, timeout=15, trade_date=trade_date, min_size=100)
+        if content is None or len(content) < 100:
+            return None
+        df = None
+        for enc in ['utf-8', 'gbk', 'gb2312', 'latin1']:
+            try:
+                df = pd.read_excel(BytesIO(content), dtype=str)
+                # 字段名标准化
+                df.columns = [c.strip().replace('\ufeff', '') for c in df.columns]
+                break
+            except Exception:
+                df = None
+                continue
+        if df is None or df.empty:
+            return None
+        df['date'] = trade_date
+        return normalize(df)
 
     def get_sz_etf_op_market(self, start_date=None, end_date=None):
         """
@@ -439,8 +552,6 @@ class foDataFetcher:
         :param end_date: 'YYYYMMDD'字符串，默认最近30天
         :return: 合并后的DataFrame
         """
-        import time
-
         # 日期处理
         if end_date is None:
             end = datetime.today()
@@ -451,51 +562,21 @@ class foDataFetcher:
         else:
             start = datetime.strptime(start_date, "%Y%m%d")
 
-        # 生成日期列表
-        date_list = []
-        cur = start
-        while cur <= end:
-            date_list.append(cur.strftime("%Y-%m-%d"))
-            cur += timedelta(days=1)
+        # 生成交易日列表
+        date_list = self.calendar.trading_days(start, end, fmt="%Y-%m-%d")
 
-        all_dfs = []
-        for trade_date in tqdm(date_list, desc="下载深交所ETF期权市场日度持仓统计"):
-            url = f"https://www.szse.cn/api/report/ShowReport?SHOWTYPE=xlsx&CATALOGID=ysprdzb&TABKEY=tab1&txtQueryDate={trade_date}"
-            headers = {
-                "Referer": "https://www.szse.cn/",
-                "User-Agent": "Mozilla/5.0"
-            }
-            try:
-                resp = requests.get(url, headers=headers, timeout=15)
-                if resp.status_code != 200 or len(resp.content) < 100:
-                    continue
-                df = None
-                for enc in ['utf-8', 'gbk', 'gb2312', 'latin1']:
-                    try:
-                        df = pd.read_excel(pd.io.common.BytesIO(resp.content), dtype=str)
-                        # 字段名标准化
-                        df.columns = [c.strip().replace('\ufeff', '') for c in df.columns]
-                        break
-                    except Exception:
-                        df = None
-                        continue
-                if df is None or df.empty:
-                    continue
-                df['date'] = trade_date
-                all_dfs.append(df)
-            except Exception as e:
-                print(f"{trade_date} 下载或解析失败: {e}")
-            time.sleep(0.2)  # 防止被封
+        url_template = "https://www.szse.cn/api/report/ShowReport?SHOWTYPE=xlsx&CATALOGID=ysprdzb&TABKEY=tab1&txtQueryDate={trade_date}"
+        all_dfs = self._run_daily(
+            lambda trade_date: self._fetch_szse_report_day(url_template, trade_date),
+            date_list, desc="下载深交所ETF期权市场日度持仓统计"
+        )
 
         if not all_dfs:
             print("未获取到任何数据")
             return pd.DataFrame()
 
-        result = pd.concat(all_dfs, ignore_index=True)
-        # 去除所有字符串字段的首尾空白字符
-        for col in result.select_dtypes(include='object').columns:
-            result[col] = result[col].astype(str).str.strip()
-        return result
+        # 字符串字段已在各日数据到达时去除首尾空白
+        return pd.concat(all_dfs, ignore_index=True)
 
 # 示例用法
 """
@@ -0,0 +1,129 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'mfkQuant', 'http')
+
+
+class HttpCache:
+    """
+    以URL为键的本地磁盘响应缓存
+    响应内容按URL的sha256存放在objects目录下，索引（大小、写入时间、最近访问时间、过期时间）存于sqlite
+    超过容量上限时按最近访问时间淘汰（LRU）
+    :param cache_dir: 缓存目录
+    :param max_bytes: 缓存容量上限（字节），默认2GB
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite'), check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, url TEXT, size INTEGER, created REAL, accessed REAL, expires REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON entries(accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, 'objects', key[:2], key)
+
+    def get(self, url):
+        """
+        读取缓存
+        :return: bytes，未命中或已过期时返回None
+        """
+        key = self._key(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT expires FROM entries WHERE key=?", (key,)).fetchone()
+            if row is not None and row[0] is not None and row[0] < now:
+                self._delete(key)
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), 'rb') as f:
+                    content = f.read()
+            except OSError:
+                self._delete(key)
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed=? WHERE key=?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return content
+
+    def put(self, url, content, ttl=None):
+        """
+        写入缓存
+        :param ttl: 有效期（秒），None表示永久保存
+        """
+        key = self._key(url)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        now = time.time()
+        expires = None if ttl is None else now + ttl
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, url, size, created, accessed, expires) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, url, len(content), now, now, expires)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _delete(self, key):
+        self._conn.execute("DELETE FROM entries WHERE key=?", (key,))
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """超过容量上限时，按最近访问时间从旧到新淘汰"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._delete(key)
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """清空全部缓存"""
+        with self._lock:
+            for (key,) in self._conn.execute("SELECT key FROM entries").fetchall():
+                self._delete(key)
+            self._conn.commit()
+
+    @property
+    def stats(self):
+        """命中、未命中、淘汰次数及当前缓存条目数和总字节数"""
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': size,
+        }
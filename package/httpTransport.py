@@ -0,0 +1,86 @@
+import time
+import random
+import threading
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+# 各交易所域名的默认请求头
+DEFAULT_HOST_HEADERS = {
+    'query.sse.com.cn': {
+        "Referer": "https://www.sse.com.cn/",
+        "User-Agent": "Mozilla/5.0"
+    },
+    'www.szse.cn': {
+        "Referer": "https://www.szse.cn/",
+        "User-Agent": "Mozilla/5.0"
+    },
+}
+
+
+class HttpTransport:
+    """
+    带连接池和重试的HTTP传输层
+    每个域名使用一个独立的requests.Session，复用keep-alive连接；
+    遇到5xx、超时、连接错误时按指数退避加随机抖动重试
+    :param pool_size: 每个域名的连接池大小，一般与并发数一致
+    :param max_retries: 最大重试次数（不含首次请求）
+    :param backoff_base: 首次重试前的基准等待秒数，之后每次翻倍
+    :param backoff_max: 单次等待秒数上限
+    :param host_headers: dict，{域名: 默认请求头}，默认为DEFAULT_HOST_HEADERS
+    :param rate_limiter: HostRateLimiter，每次请求（含重试）前取得令牌
+    """
+    def __init__(self, pool_size=4, max_retries=3, backoff_base=1.0, backoff_max=30.0,
+                 host_headers=None, rate_limiter=None):
+        self.pool_size = max(1, pool_size)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.host_headers = DEFAULT_HOST_HEADERS if host_headers is None else host_headers
+        self.rate_limiter = rate_limiter
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, host):
+        """取得域名对应的Session，首次使用时创建"""
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update(self.host_headers.get(host, {}))
+                self._sessions[host] = session
+            return self._sessions[host]
+
+    def _backoff(self, attempt):
+        """第attempt次重试前的等待秒数（full jitter）"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(self, url, headers=None, timeout=10):
+        """
+        GET请求，5xx、超时和连接错误自动重试
+        :return: requests.Response，4xx等非重试状态码直接返回
+        :raises requests.RequestException: 重试次数用尽仍失败时抛出最后一次的异常
+        """
+        session = self.session(urlparse(url).netloc)
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(url)
+            try:
+                resp = session.get(url, headers=headers, timeout=timeout)
+                if resp.status_code < 500:
+                    return resp
+                error = requests.HTTPError(f"服务器错误，状态码：{resp.status_code}", response=resp)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                error = e
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt))
+        raise error
+
+    def close(self):
+        """关闭所有Session"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
@@ -0,0 +1,148 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# int16会员ID的上限，-1表示会员简称缺失
+MAX_MEMBER_ID = np.iinfo(np.int16).max
+_BRACKETS = re.compile(r'\([^)]*\)|（[^）]*）')
+
+
+class MemberDictionary:
+    """
+    期货公司（会员）字典：规范化后的会员简称 -> int16会员ID，存于csv
+    csv每行一个名称，列为 名称、会员ID、合并至；同一会员的曾用名可通过merge合并，
+    被合并的ID记录合并去向，已按旧ID保存的数据仍可正确解码
+    每个ID的标准名称为首次登记的名称
+    :param path: csv文件路径，None则只在内存中使用；有新名称登记时自动保存
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self._ids = {}      # 规范化名称 -> 登记时的ID
+        self._names = []    # ID -> 标准名称
+        self._parent = {}   # 被合并的ID -> 合并后的ID
+        self._decode_table = None
+        if path is not None and os.path.exists(path):
+            df = pd.read_csv(path, encoding='utf-8-sig', dtype={'名称': str})
+            for name, member_id, parent in zip(df['名称'], df['会员ID'], df['合并至']):
+                member_id = int(member_id)
+                while len(self._names) <= member_id:
+                    self._names.append(None)
+                if self._names[member_id] is None:
+                    self._names[member_id] = name
+                self._ids[name] = member_id
+                if pd.notna(parent):
+                    self._parent[member_id] = int(parent)
+
+    def __len__(self):
+        return len(self._names)
+
+    @staticmethod
+    def normalize(name):
+        """
+        会员简称规范化：删除半角、全角括号及其中内容，去除所有空白字符
+        :return: str，空值或规范化后为空时返回None
+        """
+        if pd.isna(name):
+            return None
+        name = ''.join(_BRACKETS.sub('', str(name)).split())
+        return name or None
+
+    def _resolve(self, member_id):
+        """沿合并记录找到最终的会员ID"""
+        while member_id in self._parent:
+            member_id = self._parent[member_id]
+        return member_id
+
+    def _register(self, name):
+        """登记规范化后的名称，已登记时返回原ID"""
+        if name not in self._ids:
+            if len(self._names) > MAX_MEMBER_ID:
+                raise ValueError(f"会员数量超过int16上限{MAX_MEMBER_ID}")
+            self._ids[name] = len(self._names)
+            self._names.append(name)
+            self._decode_table = None
+        return self._ids[name]
+
+    def member_id(self, name):
+        """
+        单个会员简称对应的会员ID，未登记的名称自动登记
+        :return: int，空名称返回-1
+        """
+        name = self.normalize(name)
+        if name is None:
+            return -1
+        before = len(self._names)
+        member_id = self._resolve(self._register(name))
+        if len(self._names) > before:
+            self.save()
+        return member_id
+
+    def encode(self, names):
+        """
+        把会员简称序列编码为会员ID，规范化只对去重后的名称做一次，未登记的名称自动登记
+        :param names: 会员简称序列
+        :return: int16数组，空名称为-1
+        """
+        codes, uniques = pd.factorize(np.asarray(names, dtype=object))
+        before = len(self._names)
+        ids = []
+        for raw in uniques:
+            name = self.normalize(raw)
+            ids.append(-1 if name is None else self._resolve(self._register(name)))
+        if len(self._names) > before:
+            self.save()
+        # 空值的编码为-1，取到末尾追加的-1
+        return np.array(ids + [-1], dtype=np.int16)[codes]
+
+    def decode(self, ids):
+        """
+        会员ID解码为标准名称，被合并的ID解码为合并后会员的标准名称
+        :param ids: 会员ID序列
+        :return: object数组，-1为None
+        """
+        if self._decode_table is None:
+            self._decode_table = np.array(
+                [self._names[self._resolve(i)] for i in range(len(self._names))] + [None], dtype=object
+            )
+        return self._decode_table[np.asarray(ids, dtype=np.int64)]
+
+    def merge(self, alias, name):
+        """
+        把alias合并到name所属的会员，用于会员更名
+        alias已登记时，其ID及已合并到该ID的名称都并入name的ID
+        """
+        alias, name = self.normalize(alias), self.normalize(name)
+        if alias is None or name is None:
+            raise ValueError("会员简称不能为空")
+        target = self._resolve(self._register(name))
+        if alias not in self._ids:
+            self._ids[alias] = target
+        else:
+            source = self._resolve(self._ids[alias])
+            if source != target:
+                self._parent[source] = target
+        self._decode_table = None
+        self.save()
+
+    def to_frame(self):
+        """
+        字典内容
+        :return: DataFrame，列为 名称、会员ID、合并至
+        """
+        names = list(self._ids)
+        ids = [self._ids[n] for n in names]
+        return pd.DataFrame({
+            '名称': names,
+            '会员ID': ids,
+            '合并至': pd.array([self._parent.get(i) for i in ids], dtype='Int16'),
+        }).sort_values('会员ID', kind='stable')
+
+    def save(self):
+        """保存到csv，先写临时文件再改名"""
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        self.to_frame().to_csv(tmp_path, index=False, encoding='utf-8-sig')
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,133 @@
+import os
+import glob
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# 日期列统一存为date32
+DATE_COLUMNS = ['date', '日期']
+# 希腊字母等风险指标存为float32
+FLOAT32_COLUMNS = ['Delta', 'Theta', 'Gamma', 'Vega', 'Rho', '隐含波动率']
+# 代码类字段统一存为字符串，与其余字符串字段一样做字典编码
+CODE_COLUMNS = ['交易代码', '合约代码', '合约简称', '合约类型', '跟踪ETF', 'ETF代码', '多空类型', 'symbol']
+
+
+def _to_arrow(df):
+    """
+    按统一的类型规则把抓取结果转换为Arrow表：
+    日期为date32，风险指标为float32，代码及其他字符串字段为字典编码
+    """
+    df = df.copy()
+    for col in df.columns:
+        if col in DATE_COLUMNS:
+            df[col] = pd.to_datetime(df[col].astype(str), errors='coerce').dt.date
+        elif col in FLOAT32_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
+        elif col in CODE_COLUMNS:
+            df[col] = df[col].astype(str).where(df[col].notna(), None)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    fields = []
+    arrays = []
+    for field, column in zip(table.schema, table.columns):
+        if field.name in DATE_COLUMNS:
+            column = column.cast(pa.date32())
+        elif pa.types.is_string(field.type) or pa.types.is_large_string(field.type) or pa.types.is_null(field.type):
+            column = column.cast(pa.string()).dictionary_encode()
+        fields.append(pa.field(field.name, column.type))
+        arrays.append(column)
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def _key_index(table, keys):
+    """Arrow表的键列转换为MultiIndex，日期、字典编码等类型统一按字符串比较"""
+    return pd.MultiIndex.from_frame(table.select(keys).to_pandas().astype(str))
+
+
+class ParquetSink:
+    """
+    抓取结果的Parquet数据集，按 endpoint=接口/year=年份 分区存放
+    :param root: 数据集根目录
+    """
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _partition_dir(self, endpoint, year):
+        return os.path.join(self.root, f"endpoint={endpoint}", f"year={year}")
+
+    def _partition_files(self, endpoint, year):
+        return sorted(glob.glob(os.path.join(self._partition_dir(endpoint, year), "*.parquet")))
+
+    def write(self, df, endpoint, mode='append', date_col='date', keys=None):
+        """
+        写入抓取结果
+        :param df: foDataFetcher各接口返回的DataFrame
+        :param endpoint: 接口名，如'sh_option_risk'、'cffex_position_rank'
+        :param mode: 'append'追加为新文件；'overwrite'先删除df涉及年份的已有数据再写入；
+                     'upsert'按keys替换，已有数据中与df的keys取值组合相同的行全部删除，其余保留，
+                     重复写入同一批数据结果不变
+        :param date_col: 用于确定年份分区的日期列
+        :param keys: mode='upsert'时的替换键，如['date', '合约类型']，默认为[date_col]
+        :return: 写入的行数
+        """
+        if df is None or df.empty:
+            return 0
+        if mode not in ('append', 'overwrite', 'upsert'):
+            raise ValueError("mode 仅支持 'append', 'overwrite', 'upsert'")
+        keys = list(keys) if keys is not None else [date_col]
+        table = _to_arrow(df)
+        years = pd.to_datetime(df[date_col].astype(str), errors='coerce').dt.year
+        for year in sorted(years.dropna().unique()):
+            year = int(year)
+            part_dir = self._partition_dir(endpoint, year)
+            mask = pa.array((years == year).values)
+            part = table.filter(mask)
+            os.makedirs(part_dir, exist_ok=True)
+            old_files = self._partition_files(endpoint, year) if mode != 'append' else []
+            if mode == 'upsert' and old_files:
+                # 已有数据中保留键不在本次写入数据中的行，与本次数据合并为一个文件
+                old = pa.concat_tables([pq.read_table(f) for f in old_files], promote_options='permissive')
+                old = old.filter(pa.array(~_key_index(old, keys).isin(_key_index(part, keys))))
+                part = pa.concat_tables([old, part], promote_options='permissive')
+            # 先写临时文件再改名，读取方不会看到写了一半的文件
+            name = f"part-{uuid.uuid4().hex}.parquet"
+            tmp_path = os.path.join(part_dir, f".{name}.tmp")
+            pq.write_table(part, tmp_path)
+            os.replace(tmp_path, os.path.join(part_dir, name))
+            # 新文件就位后再删除被覆盖的旧文件
+            for f in old_files:
+                os.remove(f)
+        return len(df)
+
+    def years(self, endpoint):
+        """已有数据的年份列表"""
+        pattern = os.path.join(self.root, f"endpoint={endpoint}", "year=*")
+        return sorted(int(os.path.basename(p).split('=')[1]) for p in glob.glob(pattern))
+
+    def read_table(self, endpoint, start_year=None, end_year=None, columns=None):
+        """
+        读取为Arrow表
+        :param start_year: 开始年份（含），默认全部
+        :param end_year: 结束年份（含），默认全部
+        :param columns: 需要读取的字段，默认全部
+        """
+        files = []
+        for year in self.years(endpoint):
+            if (start_year is None or year >= start_year) and (end_year is None or year <= end_year):
+                files += self._partition_files(endpoint, year)
+        if not files:
+            return None
+        tables = [pq.read_table(f, columns=columns) for f in files]
+        return pa.concat_tables(tables, promote_options='permissive')
+
+    def read(self, endpoint, start_year=None, end_year=None, columns=None):
+        """
+        读取为DataFrame，字典编码字段转换为category
+        :return: DataFrame，无数据时为空DataFrame
+        """
+        table = self.read_table(endpoint, start_year, end_year, columns)
+        if table is None:
+            print(f"{endpoint} 没有找到指定年份的数据。")
+            return pd.DataFrame(columns=columns)
+        return table.to_pandas(date_as_object=False)
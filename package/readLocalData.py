@@ -1,51 +1,420 @@
 import os
+import glob
+import json
+import threading
+from collections import OrderedDict
 import pandas as pd
-from typing import List, Optional
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+from typing import Iterator, List, Optional, Union
 #readParquet2yzDF.py
+
+DEFAULT_COLUMNS = ['date', 'code', 'open', 'high', 'low', 'close', 'volume', 'turnover']
+# compact模式下转换为float32的价格字段
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+
+
+def _date_scalar(value, arrow_type):
+    """把日期转换为与date字段类型一致的Arrow标量，用于过滤条件"""
+    ts = pd.Timestamp(value)
+    if pa.types.is_timestamp(arrow_type):
+        return pa.scalar(ts.to_pydatetime()).cast(arrow_type)
+    if pa.types.is_date(arrow_type):
+        return pa.scalar(ts.date(), type=pa.date32()).cast(arrow_type)
+    # 字符串日期按'YYYY-MM-DD'比较
+    return pa.scalar(ts.strftime('%Y-%m-%d')).cast(arrow_type)
+
+
+def _compact_volume(column):
+    """成交量全部为int32范围内的整数且无缺失时转换为int32，否则保持原类型"""
+    if column.null_count or len(column) == 0:
+        return column
+    if pa.types.is_floating(column.type):
+        if not pc.all(pc.equal(column, pc.floor(column))).as_py():
+            return column
+    elif not pa.types.is_integer(column.type):
+        return column
+    lo, hi = pc.min_max(column).values()
+    if lo.as_py() < -2 ** 31 or hi.as_py() > 2 ** 31 - 1:
+        return column
+    return column.cast(pa.int32())
+
+
+def _to_frame(table, compact=False):
+    """
+    Arrow表转换为DataFrame
+    compact=True时：开高低收、换手率为float32，code为category，date为datetime64[s]，
+    成交量为整数且在int32范围内时为int32
+    """
+    if not compact:
+        return table.to_pandas()
+    for i, field in enumerate(table.schema):
+        column = table.column(i)
+        if field.name in PRICE_COLUMNS + ['turnover'] and pa.types.is_floating(field.type):
+            column = column.cast(pa.float32())
+        elif field.name == 'code':
+            column = column.dictionary_encode()
+        elif field.name == 'date':
+            if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+                column = pc.strptime(column, format='%Y-%m-%d', unit='s')
+            column = column.cast(pa.timestamp('s'))
+        elif field.name == 'volume':
+            column = _compact_volume(column)
+        else:
+            continue
+        table = table.set_column(i, pa.field(field.name, column.type), column)
+    df = table.to_pandas()
+    if 'code' in df.columns and isinstance(df['code'].dtype, pd.CategoricalDtype):
+        # 类别按代码排序，sort_values、groupby的顺序与字符串一致
+        df['code'] = df['code'].cat.reorder_categories(df['code'].cat.categories.sort_values())
+    return df
+
+
+class PartitionCache:
+    """
+    进程内已解码年份分区的LRU缓存，键为(年份, 字段元组)，值为pa.Table
+    按表占用的字节数计容量，超出上限时淘汰最久未使用的分区
+    :param max_bytes: 容量上限（字节）
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tables = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[pa.Table]:
+        """读取缓存，未命中时返回None"""
+        with self._lock:
+            table = self._tables.get(key)
+            if table is None:
+                self.misses += 1
+                return None
+            self._tables.move_to_end(key)
+            self.hits += 1
+            return table
+
+    def put(self, key, table: pa.Table):
+        """写入缓存，单个表超过容量上限时不缓存"""
+        size = table.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._tables:
+                self._bytes -= self._tables.pop(key).nbytes
+            self._tables[key] = table
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._tables.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._tables.clear()
+            self._bytes = 0
+
+    @property
+    def stats(self):
+        """命中、未命中、淘汰次数及当前缓存的分区数和总字节数"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._tables),
+                'bytes': self._bytes,
+            }
+
+
 class LocalMarketData:
-    def __init__(self, base_dir: str):
+    """
+    本地后复权行情数据，按year=年份分区的parquet
+    :param base_dir: 数据根目录
+    :param ipc_cache_dir: 可选的本地缓存目录。每个年份分区首次读取时转换为未压缩的Arrow IPC文件，
+                          之后以内存映射方式读取，免去parquet解压，多个进程共享操作系统页缓存；
+                          源分区文件的修改时间或大小变化时自动重建
+    :param cache_bytes: 进程内分区缓存的容量（字节），大于0时缓存已解码的年份分区（按年份和字段），
+                        滑动年份窗口等重复读取同一年份时不再访问磁盘；0表示不缓存
+    """
+    def __init__(self, base_dir: str, ipc_cache_dir: Optional[str] = None, cache_bytes: int = 0):
         self.base_dir = base_dir
+        self.ipc_cache_dir = ipc_cache_dir
+        if ipc_cache_dir is not None:
+            os.makedirs(ipc_cache_dir, exist_ok=True)
+        self._mmap_fs = pafs.LocalFileSystem(use_mmap=True)
+        self.partition_cache = PartitionCache(cache_bytes) if cache_bytes > 0 else None
+
+    def years(self) -> List[int]:
+        """本地已有数据的年份列表"""
+        pattern = os.path.join(self.base_dir, 'year=*')
+        return sorted(int(os.path.basename(p).split('=')[1]) for p in glob.glob(pattern))
+
+    def count_rows(self, years: Optional[List[int]] = None) -> dict:
+        """
+        各年份分区的行数，只读取parquet文件尾部的元数据
+        :param years: 年份列表，默认全部年份
+        :return: {年份: 行数}，没有数据的年份为0
+        """
+        return {
+            year: sum(pq.read_metadata(f).num_rows for f in self._year_files(year))
+            for year in (self.years() if years is None else years)
+        }
+
+    def _year_files(self, year: int) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.base_dir, f'year={year}', '*.parquet')))
+
+    def _year_dataset(self, year: int) -> Optional[ds.Dataset]:
+        """单个年份分区的pyarrow数据集，启用IPC缓存时读取缓存文件，分区不存在时返回None"""
+        files = self._year_files(year)
+        if not files:
+            return None
+        if self.ipc_cache_dir is not None:
+            path = self._ensure_ipc(year, files)
+            return ds.dataset(path, format='ipc', filesystem=self._mmap_fs)
+        return ds.dataset(files, format='parquet')
+
+    @staticmethod
+    def _fingerprint(files):
+        """源分区文件的名称、修改时间和大小，任一变化即视为缓存失效"""
+        result = []
+        for f in files:
+            st = os.stat(f)
+            result.append([os.path.basename(f), st.st_mtime_ns, st.st_size])
+        return result
+
+    def _ensure_ipc(self, year: int, files: List[str]) -> str:
+        """
+        确保年份分区的IPC缓存存在且与源文件一致，必要时重新转换
+        :return: IPC文件路径
+        """
+        path = os.path.join(self.ipc_cache_dir, f'year={year}.arrow')
+        meta_path = f'{path}.json'
+        fingerprint = self._fingerprint(files)
+        if os.path.exists(path) and os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as f:
+                if json.load(f) == fingerprint:
+                    return path
+        # 按批次流式转换，内存占用与单个批次相当；先写临时文件再改名，并发读取不会看到写了一半的文件
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        scanner = ds.dataset(files, format='parquet').scanner()
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, scanner.projected_schema) as writer:
+                for batch in scanner.to_batches():
+                    writer.write_batch(batch)
+        os.replace(tmp_path, path)
+        with open(f'{meta_path}.{os.getpid()}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(fingerprint, f)
+        os.replace(f'{meta_path}.{os.getpid()}.tmp', meta_path)
+        return path
+
+    def build_ipc_cache(self, years: Optional[List[int]] = None) -> List[str]:
+        """
+        预先转换IPC缓存，已是最新的年份直接跳过
+        :param years: 年份列表，默认全部年份
+        :return: IPC文件路径列表
+        """
+        if self.ipc_cache_dir is None:
+            raise ValueError("未设置ipc_cache_dir")
+        paths = []
+        for year in (self.years() if years is None else years):
+            files = self._year_files(year)
+            if files:
+                paths.append(self._ensure_ipc(year, files))
+        return paths
+
+    def _filter(self, schema, start_date=None, end_date=None, codes=None):
+        """
+        构建下推到扫描的过滤条件，parquet按行组统计信息跳过不满足条件的行组
+        :return: pyarrow表达式，无条件时返回None
+        """
+        expr = None
+        conditions = []
+        if start_date is not None:
+            conditions.append(ds.field('date') >= _date_scalar(start_date, schema.field('date').type))
+        if end_date is not None:
+            conditions.append(ds.field('date') <= _date_scalar(end_date, schema.field('date').type))
+        if codes is not None:
+            code_values = pa.array([str(c) for c in codes]).cast(schema.field('code').type)
+            conditions.append(ds.field('code').isin(code_values))
+        for condition in conditions:
+            expr = condition if expr is None else expr & condition
+        return expr
+
+    def _scan(self, years, columns, start_date=None, end_date=None, codes=None, use_threads=True):
+        """
+        逐年扫描并合并为Arrow表
+        :return: pa.Table，没有任何年份的数据时返回None
+        """
+        tables = []
+        for year in years:
+            if self.partition_cache is not None:
+                # 缓存整年分区，过滤条件在内存中执行
+                key = (year, tuple(columns))
+                table = self.partition_cache.get(key)
+                if table is None:
+                    dataset = self._year_dataset(year)
+                    if dataset is None:
+                        continue
+                    table = dataset.to_table(columns=columns, use_threads=use_threads)
+                    self.partition_cache.put(key, table)
+                expr = self._filter(table.schema, start_date, end_date, codes)
+                tables.append(table if expr is None else table.filter(expr))
+                continue
+            dataset = self._year_dataset(year)
+            if dataset is None:
+                continue
+            expr = self._filter(dataset.schema, start_date, end_date, codes)
+            tables.append(dataset.to_table(columns=columns, filter=expr, use_threads=use_threads))
+        if not tables:
+            return None
+        return pa.concat_tables(tables, promote_options='permissive')
+
+    @staticmethod
+    def _columns(columns):
+        """需要读取的字段，默认DEFAULT_COLUMNS，并确保包含'date'、'code'"""
+        if columns is None:
+            return list(DEFAULT_COLUMNS)
+        # 确保'date','code'一定包含
+        columns = list(columns)
+        for col in ['date', 'code']:
+            if col not in columns:
+                columns.insert(0, col)
+        return columns
+
+    def _resolve_years(self, start_year, end_year, start_date, end_date):
+        """由年份参数和日期参数确定需要读取的年份"""
+        available = self.years()
+        if not available:
+            return []
+        lo = available[0] if start_year is None else start_year
+        hi = available[-1] if end_year is None else end_year
+        if start_date is not None:
+            lo = max(lo, pd.Timestamp(start_date).year)
+        if end_date is not None:
+            hi = min(hi, pd.Timestamp(end_date).year)
+        return [y for y in available if lo <= y <= hi]
 
     def read_hfq_data(
         self,
-        start_year: int,
-        end_year: int,
-        columns: Optional[List[str]] = None
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+        columns: Optional[List[str]] = None,
+        start_date=None,
+        end_date=None,
+        codes: Optional[List[str]] = None,
+        use_threads: bool = True,
+        compact: bool = False
     ) -> pd.DataFrame:
         """
         读取本地后复权行情数据
+        日期和股票代码条件下推到pyarrow扫描：只打开涉及的年份分区，并按parquet统计信息跳过行组
 
-        :param start_year: 开始年份（含）
-        :param end_year: 结束年份（含）
+        :param start_year: 开始年份（含），默认由start_date确定，都未指定时为最早年份
+        :param end_year: 结束年份（含），默认由end_date确定，都未指定时为最新年份
         :param columns: 需要读取的字段，默认为['date', 'code', 'open', 'high', 'low', 'close', 'volume', 'turnover']
+        :param start_date: 开始日期（含），如'20240601'、'2024-06-01'
+        :param end_date: 结束日期（含）
+        :param codes: 股票代码列表，如['000001', '600000']，默认全部
+        :param use_threads: 是否多线程并行扫描多个文件
+        :param compact: 紧凑类型模式，内存占用约为默认模式的一半以下：
+                        开高低收、换手率为float32，code为category，date为datetime64[s]（pandas不支持[D]精度），
+                        成交量全部为int32范围内的整数时为int32，否则保持原类型；成交额等其他字段不变。
+                        float32只有约7位有效数字，价格超过约32768时无法精确到分，round(价格, 2)的比较结果可能与float64不同，
+                        涨跌停判断等依赖精确到分的计算应使用默认模式，或先转换回float64
         :return: 合并后的DataFrame
         """
-        default_cols = ['date', 'code', 'open', 'high', 'low', 'close', 'volume', 'turnover']
-        if columns is None:
-            columns = default_cols
-        else:
-            # 确保'date','code'一定包含
-            for col in ['date', 'code']:
-                if col not in columns:
-                    columns.insert(0, col)
-
-        years = [str(y) for y in range(start_year, end_year + 1)]
-        dfs = []
-        for year in years:
-            year_dir = os.path.join(self.base_dir, f'year={year}')
-            if os.path.exists(year_dir):
-                df_year = pd.read_parquet(year_dir, columns=columns, engine='pyarrow')
-                dfs.append(df_year)
-        if dfs:
-            df = pd.concat(dfs, ignore_index=True)
-            return df
+        columns = self._columns(columns)
+        years = self._resolve_years(start_year, end_year, start_date, end_date)
+        table = self._scan(years, columns, start_date, end_date, codes, use_threads)
+        if table is not None:
+            return _to_frame(table, compact)
         else:
             print("没有找到指定年份的数据。")
             return pd.DataFrame(columns=columns)
 
+    def _row_bytes(self, years, columns) -> float:
+        """按首个年份的前若干行估算每行转换为DataFrame后占用的内存字节数"""
+        for year in years:
+            dataset = self._year_dataset(year)
+            if dataset is None:
+                continue
+            sample = dataset.head(10000, columns=columns)
+            if sample.num_rows:
+                return sample.to_pandas().memory_usage(deep=True).sum() / sample.num_rows
+        return 64.0
+
+    def iter_hfq_batches(
+        self,
+        by: str = 'code',
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+        columns: Optional[List[str]] = None,
+        start_date=None,
+        end_date=None,
+        codes: Optional[List[str]] = None,
+        memory_budget: int = 512 * 1024 ** 2,
+        as_arrow: bool = False,
+        use_threads: bool = True,
+        compact: bool = False
+    ) -> Iterator[Union[pd.DataFrame, pa.Table]]:
+        """
+        分批读取本地后复权行情数据，每批占用内存约为memory_budget以内（按抽样估算的每行内存），
+        适用于整体装不下内存的全市场长历史
+
+        by='code'时每批包含若干只股票在整个区间内的完整历史（同一只股票不会被拆到两批），按code、date排序；
+        by='date'时每批为连续若干个交易日的全部股票，按date、code排序。
+        先只读取code或date一列统计各股票、各交易日的行数，再按估算的每行内存切分批次，每批单独下推过滤扫描
+
+        :param by: 'code'或'date'
+        :param memory_budget: 每批DataFrame的内存上限（字节），单只股票或单个交易日超出上限时单独成批
+        :param as_arrow: True时返回pa.Table，否则返回DataFrame
+        :param compact: 同read_hfq_data，仅对DataFrame生效
+        其余参数同read_hfq_data
+        :return: 生成器
+        """
+        if by not in ('code', 'date'):
+            raise ValueError("by 仅支持 'code', 'date'")
+        columns = self._columns(columns)
+        years = self._resolve_years(start_year, end_year, start_date, end_date)
+        keys = self._scan(years, [by], start_date, end_date, codes, use_threads)
+        if keys is None or keys.num_rows == 0:
+            return
+        counts = pc.value_counts(keys.column(by).combine_chunks())
+        order = pc.sort_indices(counts.field('values'))
+        values = counts.field('values').take(order).to_pylist()
+        rows = counts.field('counts').take(order).to_numpy()
+        max_rows = max(1, int(memory_budget / self._row_bytes(years, columns)))
+
+        start = 0
+        while start < len(values):
+            end, total = start + 1, rows[start]
+            while end < len(values) and total + rows[end] <= max_rows:
+                total += rows[end]
+                end += 1
+            if by == 'code':
+                table = self._scan(years, columns, start_date, end_date, values[start:end], use_threads)
+                table = table.sort_by([('code', 'ascending'), ('date', 'ascending')])
+            else:
+                lo, hi = pd.Timestamp(values[start]), pd.Timestamp(values[end - 1])
+                chunk_years = [y for y in years if lo.year <= y <= hi.year]
+                table = self._scan(chunk_years, columns, lo, hi, codes, use_threads)
+                table = table.sort_by([('date', 'ascending'), ('code', 'ascending')])
+            yield table if as_arrow else _to_frame(table, compact)
+            start = end
+
 # 示例用法
 if __name__ == "__main__":
     base_dir = '/Users/dremind/Nutstore Files/.symlinks/坚果云/mfkQuant/parquet数据/parquet_by_year'
     market_data = LocalMarketData(base_dir)
     df = market_data.read_hfq_data(2022, 2025)
-    print(df.head())
\ No newline at end of file
+    print(df.head())
+    # 只读取50只股票一个月的数据
+    df_month = market_data.read_hfq_data(start_date='20250601', end_date='20250630', codes=df['code'].unique()[:50])
+    print(df_month.shape)
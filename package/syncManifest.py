@@ -0,0 +1,74 @@
+import sqlite3
+from datetime import datetime, timedelta
+import pandas as pd
+
+
+class SyncManifest:
+    """
+    增量同步清单，记录已入库的(接口, 品种, 日期)及其行数，存于sqlite
+    :param path: sqlite文件路径
+    :param stale_days: 数据日期后多少天内抓取到的空数据视为未定稿，下次同步时重新抓取
+    """
+    def __init__(self, path, stale_days=3):
+        self.path = path
+        self.stale_days = stale_days
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS units ("
+            "endpoint TEXT, symbol TEXT, date TEXT, rows INTEGER, fetched_at TEXT, "
+            "PRIMARY KEY (endpoint, symbol, date))"
+        )
+        self._conn.commit()
+
+    def _is_stale(self, date, rows, fetched_at):
+        """
+        数据日期后stale_days天内抓取到的空数据可能是交易所尚未发布，需要重新抓取
+        """
+        if rows > 0:
+            return False
+        date = datetime.strptime(date, "%Y%m%d")
+        fetched = datetime.strptime(fetched_at, "%Y-%m-%d %H:%M:%S")
+        return fetched < date + timedelta(days=self.stale_days + 1)
+
+    def missing_dates(self, endpoint, symbol, dates):
+        """
+        筛选需要抓取的日期：清单中没有记录或记录已过时
+        :param dates: 'YYYYMMDD'字符串列表
+        :return: list，保持dates原顺序
+        """
+        done = {
+            date: (rows, fetched_at)
+            for date, rows, fetched_at in self._conn.execute(
+                "SELECT date, rows, fetched_at FROM units WHERE endpoint=? AND symbol=?", (endpoint, symbol)
+            )
+        }
+        return [d for d in dates if d not in done or self._is_stale(d, *done[d])]
+
+    def mark_done(self, endpoint, symbol, rows_by_date):
+        """
+        记录已完成入库的日期
+        :param rows_by_date: dict，{'YYYYMMDD': 行数}，无数据的交易日行数为0
+        """
+        fetched_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO units (endpoint, symbol, date, rows, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                [(endpoint, symbol, d, int(n), fetched_at) for d, n in rows_by_date.items()]
+            )
+
+    def summary(self, endpoint=None):
+        """
+        各接口、品种已入库的日期范围、天数和总行数
+        :return: DataFrame
+        """
+        sql = ("SELECT endpoint, symbol, MIN(date) AS start_date, MAX(date) AS end_date, "
+               "COUNT(*) AS days, SUM(rows) AS rows FROM units")
+        params = ()
+        if endpoint is not None:
+            sql += " WHERE endpoint=?"
+            params = (endpoint,)
+        sql += " GROUP BY endpoint, symbol"
+        return pd.read_sql_query(sql, self._conn, params=params)
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,146 @@
+import os
+import glob
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# 仓库根目录，默认从这里查找本地行情数据
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ETF_DIR = os.path.join(REPO_DIR, '01数据获取', '规模指数ETF日线')
+DEFAULT_PARQUET_DIR = os.path.join(REPO_DIR, '历史行情数据')
+
+
+def _to_day(d):
+    """把'YYYYMMDD'、'YYYY-MM-DD'、datetime、date等统一转换为numpy datetime64[D]"""
+    if isinstance(d, np.datetime64):
+        return d.astype('datetime64[D]')
+    if isinstance(d, str) and len(d) == 8 and d.isdigit():
+        d = f"{d[:4]}-{d[4:6]}-{d[6:]}"
+    return np.datetime64(pd.Timestamp(d).date(), 'D')
+
+
+def _weekdays(start, end):
+    """[start, end]区间内的周一至周五"""
+    if end < start:
+        return np.array([], dtype='datetime64[D]')
+    days = np.arange(start, end + np.timedelta64(1, 'D'), dtype='datetime64[D]')
+    return days[np.is_busday(days)]
+
+
+class TradeCalendar:
+    """
+    离线交易日历，由本地已有的行情数据中的交易日期构建
+    内部为有序的datetime64[D]数组，所有查询均为二分查找
+    超出本地数据覆盖范围的日期按周一至周五近似（无法识别节假日）
+    """
+    def __init__(self, trading_days):
+        days = np.unique(np.asarray(trading_days, dtype='datetime64[D]'))
+        self._known = days
+        self._days = days
+        # 当前_days覆盖的自然日区间
+        self._lo = days[0] if len(days) else None
+        self._hi = days[-1] if len(days) else None
+
+    @classmethod
+    def from_local_data(cls, etf_dir=DEFAULT_ETF_DIR, parquet_paths=None):
+        """
+        从本地数据构建交易日历
+        :param etf_dir: ETF日线csv所在目录，读取所有'*日K*.csv'的date列
+        :param parquet_paths: parquet文件或目录列表，读取date列，默认为仓库中的'历史行情数据'
+        :return: TradeCalendar
+        """
+        if parquet_paths is None:
+            parquet_paths = [DEFAULT_PARQUET_DIR]
+        parts = []
+        if etf_dir and os.path.isdir(etf_dir):
+            for path in sorted(glob.glob(os.path.join(etf_dir, '*日K*.csv'))):
+                df = pd.read_csv(path, usecols=['date'], encoding='utf-8-sig')
+                parts.append(pd.to_datetime(df['date']).values.astype('datetime64[D]'))
+        for path in parquet_paths:
+            if os.path.isdir(path):
+                files = sorted(glob.glob(os.path.join(path, '**', '*.parquet'), recursive=True))
+            elif os.path.exists(path):
+                files = [path]
+            else:
+                files = []
+            for file in files:
+                col = pq.read_table(file, columns=['date']).column('date')
+                parts.append(pd.to_datetime(col.to_numpy()).values.astype('datetime64[D]'))
+        if not parts:
+            print("未找到本地交易日期数据，交易日历将按周一至周五近似。")
+            return cls([])
+        return cls(np.concatenate(parts))
+
+    @classmethod
+    def from_csv(cls, path):
+        """从to_csv保存的文件读取交易日历"""
+        df = pd.read_csv(path, dtype=str)
+        return cls(pd.to_datetime(df['date']).values)
+
+    def to_csv(self, path):
+        """把本地数据得到的交易日保存为csv，便于在没有行情数据的机器上使用"""
+        pd.DataFrame({'date': self._known.astype(str)}).to_csv(path, index=False)
+
+    def _ensure(self, start, end):
+        """确保内部数组覆盖[start, end]，本地数据之外的部分用周一至周五补齐"""
+        if self._lo is None:
+            self._days = _weekdays(start, end)
+            self._lo, self._hi = start, end
+            return
+        one_day = np.timedelta64(1, 'D')
+        if start < self._lo:
+            self._days = np.concatenate([_weekdays(start, self._lo - one_day), self._days])
+            self._lo = start
+        if end > self._hi:
+            self._days = np.concatenate([self._days, _weekdays(self._hi + one_day, end)])
+            self._hi = end
+
+    def is_trading_day(self, d):
+        """是否为交易日"""
+        d = _to_day(d)
+        self._ensure(d, d)
+        i = np.searchsorted(self._days, d)
+        return bool(i < len(self._days) and self._days[i] == d)
+
+    def offset(self, d, n):
+        """
+        交易日偏移
+        :param d: 基准日期
+        :param n: 偏移的交易日数，正数向后、负数向前；n=0时返回d本身或其后第一个交易日
+        :return: pd.Timestamp
+        """
+        d = _to_day(d)
+        # 每个交易日对应不超过两个自然日，向两侧多留余量
+        pad = np.timedelta64(abs(int(n)) * 2 + 14, 'D')
+        self._ensure(d - pad, d + pad)
+        if n > 0:
+            i = np.searchsorted(self._days, d, side='right') + n - 1
+        elif n < 0:
+            i = np.searchsorted(self._days, d, side='left') + n
+        else:
+            i = np.searchsorted(self._days, d, side='left')
+        return pd.Timestamp(self._days[i])
+
+    def next_trading_day(self, d):
+        """d之后（不含d）的第一个交易日"""
+        return self.offset(d, 1)
+
+    def prev_trading_day(self, d):
+        """d之前（不含d）的最后一个交易日"""
+        return self.offset(d, -1)
+
+    def trading_days_array(self, start, end):
+        """[start, end]区间内的交易日，datetime64[D]数组"""
+        start, end = _to_day(start), _to_day(end)
+        self._ensure(start, end)
+        lo = np.searchsorted(self._days, start, side='left')
+        hi = np.searchsorted(self._days, end, side='right')
+        return self._days[lo:hi]
+
+    def trading_days(self, start, end, fmt="%Y%m%d"):
+        """
+        枚举[start, end]区间内的交易日
+        :param fmt: 输出日期字符串格式，如"%Y%m%d"、"%Y-%m-%d"
+        :return: list[str]
+        """
+        return pd.DatetimeIndex(self.trading_days_array(start, end)).strftime(fmt).tolist()